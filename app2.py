@@ -7,7 +7,8 @@ from tensorflow.keras.models import load_model, Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense
 from tensorflow.keras.preprocessing.image import load_img, img_to_array
 import tensorflow as tf
-from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES
+from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES, MODEL_PATH
+from model_registry import get_model, save_model
 from tensorflow.keras.optimizers import Adam
 from sklearn.model_selection import train_test_split
 
@@ -32,11 +33,16 @@ if "historial" not in st.session_state:
     st.session_state.historial = {}
 
 # ---------------------- CARGA Y GESTIÓN DEL MODELO ----------------------
-def load_or_create_model():
-    """Carga el modelo o crea uno nuevo si no existe."""
-    model_path = "unet_periodontal.h5"
-    if os.path.exists(model_path):
-        model = load_model(model_path, compile=False)
+def load_or_create_model(shared=True):
+    """Carga el modelo o crea uno nuevo si no existe.
+
+    Con shared=True devuelve la instancia compartida del registro (solo
+    lectura); para reentrenar se carga una copia propia desde disco.
+    """
+    if os.path.exists(MODEL_PATH):
+        if shared:
+            return get_model(MODEL_PATH)
+        model = load_model(MODEL_PATH, compile=False)
     else:
         model = create_new_model()
     return model
@@ -57,9 +63,10 @@ def create_new_model():
 
 def retrain_model(training_images, training_labels):
     """Reentrena el modelo con los nuevos datos."""
-    model = load_or_create_model()
+    model = load_or_create_model(shared=False)
     model.fit(training_images, training_labels, epochs=10, batch_size=32, validation_split=0.2)
-    model.save("unet_periodontal.h5")
+    # Guardado atómico: el registro sustituye el modelo compartido al detectar el cambio
+    save_model(model, MODEL_PATH)
     st.success("Modelo reentrenado y guardado exitosamente.")
     return model
 
@@ -1,12 +1,12 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 import os
-import matplotlib.pyplot as plt
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-import tensorflow as tf
-from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES
+from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES, INFERENCE_SERVER_URL
+from model_registry import get_model
+from inference_backend import inference_model_path
+from inference_server import get_server
+from inference import load_rgb
+from overlay import render_overlay
 
 # ---------------------- USUARIOS ----------------------
 if "users" not in st.session_state:
@@ -138,49 +138,34 @@ def ver_historial_paciente():
         st.warning("No tienes historial clínico aún.")
 
 # ---------------------- IA y diagnóstico ----------------------
-model = load_model("unet_periodontal.h5", compile=False)
+if not INFERENCE_SERVER_URL:
+    # Carga y calienta el modelo una sola vez por proceso; con un servidor
+    # remoto la inferencia se hace allí
+    get_model(inference_model_path())
 
 diagnosis_labels = {
     0: "Sano", 1: "Gingivitis Leve", 2: "Gingivitis Moderada",
     3: "Gingivitis Severa", 4: "Placa Bacteriana", 5: "Sarro", 6: "Otros"
 }
 
-def get_predicted_diagnosis(pred_mask):
-    classes, counts = np.unique(pred_mask, return_counts=True)
-    class_id = classes[np.argmax(counts)]
+def get_predicted_diagnosis(class_counts):
+    """Clase con más píxeles a partir de los conteos por clase (ver predict_stats)."""
+    class_id = int(np.argmax(class_counts))
     return diagnosis_labels.get(class_id, "Desconocido"), class_id
 
 def show_image_and_prediction(image_path, patient_name):
-    img = load_img(image_path, target_size=(IMG_HEIGHT, IMG_WIDTH))
-    img_array = img_to_array(img) / 255.0
-    img_array_exp = np.expand_dims(img_array, axis=0)
+    import matplotlib.pyplot as plt  # solo al mostrar una predicción, no al arrancar
 
-    pred = model.predict(img_array_exp)[0]
-    pred_mask = np.argmax(pred, axis=-1)
+    img = load_rgb(image_path, (IMG_HEIGHT, IMG_WIDTH))
+    img_array = img.astype(np.float32) / 255.0
 
-    pred_diag, pred_class = get_predicted_diagnosis(pred_mask)
+    # El servidor agrupa esta petición con las de otras sesiones
+    pred_mask, class_counts, class_confidence = get_server().predict_stats(img_array)
 
-    # Crear superposición con colores
-    overlay = img_array.copy()
-    mask_colors = {
-        1: [255, 255, 0],   # Gingivitis leve: Amarillo
-        2: [255, 165, 0],   # Gingivitis moderada: Naranja
-        3: [255, 0, 0],     # Gingivitis severa: Rojo
-        4: [0, 255, 0],     # Placa bacteriana: Verde
-        5: [0, 0, 255],     # Sarro: Azul
-        6: [128, 0, 128]    # Otros: Morado
-    }
-
-    alpha = 0.5
-    color_mask = np.zeros_like(img_array)
-
-    for class_id, color in mask_colors.items():
-        mask = pred_mask == class_id
-        for i in range(3):  # Aplicar color a cada canal RGB
-            color_mask[..., i] += mask * color[i]
+    pred_diag, pred_class = get_predicted_diagnosis(class_counts)
 
-    # Aplicar transparencia (alpha blending)
-    blended = (1 - alpha) * img_array + alpha * (color_mask / 255.0)
+    # Crear superposición con colores (alpha blending)
+    blended = render_overlay(img_array, pred_mask, alpha=0.5)
 
     fig, ax = plt.subplots(1, 2, figsize=(12, 5))
     ax[0].imshow(img)
@@ -195,7 +180,8 @@ def show_image_and_prediction(image_path, patient_name):
     st.subheader("🧠 Diagnóstico IA")
     st.markdown(f"""
     **Segmentación**: lesiones detectadas en múltiples zonas  
-    **Nivel de enfermedad**: Clase {pred_class} ({pred_diag})
+    **Nivel de enfermedad**: Clase {pred_class} ({pred_diag})  
+    **Confianza media**: {class_confidence[pred_class]:.0%}
     """)
 
     st.subheader("📝 Observaciones del odontólogo")
@@ -1,62 +1,138 @@
 import streamlit as st
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
+from PIL import Image
 from db_operations import DBOperations
 from crear_bd import inicializar_base_datos
+from model_registry import get_model, get_model_version
+from inference_backend import inference_model_path
+from inference import load_rgb
+from inference_server import get_server
+from prediction_cache import PredictionCache, get_prediction_cache
+from overlay import render_overlay
+from tiled_inference import predict_image_tiled
+from thumbnails import make_thumbnail, get_thumbnail
+from contextlib import nullcontext
+from tracing import span, get_tracer
+from config import NUM_CLASSES, FULL_RES_INFERENCE, TILE_SCALE, DISPLAY_MAX_SIZE, INFERENCE_SERVER_URL, DIAGNOSIS_LABELS
 from datetime import datetime
 
 # Configuración inicial
 inicializar_base_datos()
-model = load_model("unet_periodontal.h5", compile=False)
-
-# Constantes
-DIAGNOSIS_LABELS = {
-    0: "Sano", 1: "Gingivitis Leve", 2: "Gingivitis Moderada",
-    3: "Gingivitis Severa", 4: "Placa Bacteriana", 5: "Sarro", 6: "Otros"
-}
-
-COLOR_MAP = {
-    1: [255, 255, 0],    # Gingivitis leve: Amarillo
-    2: [255, 165, 0],    # Gingivitis moderada: Naranja
-    3: [255, 0, 0],      # Gingivitis severa: Rojo
-    4: [0, 255, 0],      # Placa bacteriana: Verde
-    5: [0, 0, 255],      # Sarro: Azul
-    6: [128, 0, 128]     # Otros: Morado
-}
+SERVING_MODEL = inference_model_path()  # Keras o TFLite según INFERENCE_BACKEND
+if FULL_RES_INFERENCE or not INFERENCE_SERVER_URL:
+    # Carga y calienta el modelo una sola vez por proceso; con un servidor
+    # remoto solo hace falta aquí para la inferencia por teselas
+    get_model(SERVING_MODEL)
 
 # ---------------------- FUNCIONES DE APOYO ----------------------
-def get_predicted_diagnosis(pred_mask):
-    classes, counts = np.unique(pred_mask, return_counts=True)
-    class_id = classes[np.argmax(counts)] if len(classes) > 0 else 0
+def get_predicted_diagnosis(class_counts):
+    """Clase con más píxeles a partir de los conteos por clase."""
+    class_id = int(np.argmax(class_counts))
     return DIAGNOSIS_LABELS.get(class_id, "Desconocido"), class_id
 
+def predict_image(image_path):
+    """Devuelve (imagen uint8, superposición uint8, píxeles por clase, confianza por clase).
+
+    Imagen y superposición tienen el tamaño en que se muestran. La confianza es
+    None en la inferencia por teselas, que solo devuelve la máscara.
+    """
+    if FULL_RES_INFERENCE:
+        # Máscara a resolución completa por ventanas solapadas de 256x256
+        with span("diagnostico.inferencia_teselas"):
+            image, pred_mask = predict_image_tiled(get_model(SERVING_MODEL), image_path, scale=TILE_SCALE)
+        h, w = pred_mask.shape
+        factor = min(1.0, DISPLAY_MAX_SIZE / max(h, w))
+        size = (max(1, round(w * factor)), max(1, round(h * factor)))
+        with span("diagnostico.superposicion"):
+            blended = render_overlay(image, pred_mask, alpha=0.5, size=size)
+            if factor < 1:
+                # En la caché solo entra la versión que se muestra, no la resolución completa
+                image = np.asarray(Image.fromarray(image).resize(size, Image.BILINEAR))
+        return image, blended, np.bincount(pred_mask.ravel(), minlength=NUM_CLASSES), None
+
+    with span("diagnostico.decodificacion"):
+        image = load_rgb(image_path)
+        img_array = image.astype(np.float32) / 255.0
+
+    # El servidor agrupa esta petición con las de otras sesiones
+    # Máscara, conteos y confianza salen del grafo: no se copian las probabilidades
+    # (incluye la espera en la cola del servidor, ver servidor.espera_cola)
+    with span("diagnostico.inferencia"):
+        pred_mask, class_counts, class_confidence = get_server().predict_stats(img_array)
+
+    # Crear superposición de colores con transparencia
+    with span("diagnostico.superposicion"):
+        blended = render_overlay(image, pred_mask, alpha=0.5)
+    return image, blended, class_counts, class_confidence
+
 def process_and_predict_image(image_path):
-    img = load_img(image_path, target_size=(256, 256))
-    img_array = img_to_array(img) / 255.0
-    img_array_exp = np.expand_dims(img_array, axis=0)
+    # Las reejecuciones de Streamlit con la misma imagen no repiten la predicción
+    if FULL_RES_INFERENCE:
+        model_version = f"{get_model_version(SERVING_MODEL)}-tiled{TILE_SCALE}"
+    else:
+        # Versión del modelo que sirve el servidor, sin cargarlo aquí si es remoto
+        model_version = get_server().model_version()
+    cache = get_prediction_cache()
+    with span("diagnostico.cache"):
+        with open(image_path, "rb") as f:
+            cache_key = PredictionCache.make_key(f.read(), model_version)
+        result = cache.get(cache_key)
 
-    pred = model.predict(img_array_exp)[0]
-    pred_mask = np.argmax(pred, axis=-1)
+    if result is None:
+        image, blended, class_counts, class_confidence = predict_image(image_path)
+        # Solo lo que se muestra y las estadísticas; la máscara no hace falta después
+        result = {
+            "image": image,
+            "histogram": class_counts,
+            "overlay": blended,
+        }
+        if class_confidence is not None:
+            result["confidence"] = class_confidence
+        with span("diagnostico.cache_guardar"):
+            cache.put(cache_key, result)
 
-    pred_diag, pred_class = get_predicted_diagnosis(pred_mask)
-    
-    # Crear superposición de colores
-    overlay = img_array.copy()
-    color_mask = np.zeros_like(img_array)
+    pred_diag, pred_class = get_predicted_diagnosis(result["histogram"])
+    # Sin confianza en la inferencia por teselas ni en entradas de caché anteriores
+    confidence = result.get("confidence")
+    pred_conf = None if confidence is None else float(confidence[pred_class])
 
-    for class_id, color in COLOR_MAP.items():
-        mask = pred_mask == class_id
-        for i in range(3):
-            color_mask[..., i] += mask * color[i]
+    return Image.fromarray(result["image"]), result["overlay"], pred_diag, pred_class, pred_conf
 
-    # Aplicar transparencia
-    alpha = 0.5
-    blended = (1 - alpha) * img_array + alpha * (color_mask / 255.0)
+def patient_selector(label, key):
+    """Selector de pacientes con búsqueda y paginación por clave.
 
-    return img, blended, pred_diag, pred_class
+    Devuelve el id_paci seleccionado o None si no hay pacientes.
+    """
+    busqueda = st.text_input("Buscar por apellido, nombre o DNI", key=f"{key}_busqueda")
+    
+    # Pila con la clave de inicio de cada página visitada; se reinicia al cambiar la búsqueda
+    if st.session_state.get(f"{key}_ultima_busqueda") != busqueda:
+        st.session_state[f"{key}_paginas"] = [None]
+        st.session_state[f"{key}_ultima_busqueda"] = busqueda
+    paginas = st.session_state[f"{key}_paginas"]
+    
+    pacientes, siguiente = DBOperations.search_patients(busqueda, after=paginas[-1])
+    if not pacientes:
+        return None
+    
+    # Mapeo entre opción mostrada y ID de paciente
+    paciente_dict = {
+        f"{p['nom_usu']} {p['ape_usu']} (DNI: {p['dni_usu']})": p['id_paci']
+        for p in pacientes
+    }
+    
+    paciente_seleccionado = st.selectbox(label, options=list(paciente_dict), key=key)
+    
+    col1, col2 = st.columns(2)
+    if len(paginas) > 1 and col1.button("◀ Anterior", key=f"{key}_anterior"):
+        paginas.pop()
+        st.rerun()
+    if siguiente is not None and col2.button("Siguiente ▶", key=f"{key}_siguiente"):
+        paginas.append(siguiente)
+        st.rerun()
+    
+    return paciente_dict[paciente_seleccionado]
 
 # ---------------------- PÁGINAS DE LA APLICACIÓN ----------------------
 def login_page():
@@ -116,13 +192,52 @@ def admin_dashboard():
     st.title("⚙️ Panel de Administración")
     st.write(f"Bienvenido administrador: {st.session_state.user['nom_usu']}")
 
+    st.subheader("⏱️ Latencia del diagnóstico")
+    latency_page()
+
+def latency_page():
+    """Percentiles por etapa del diagnóstico desde que arrancó el proceso (ver tracing.py)."""
+    tracer = get_tracer()
+    snapshot = tracer.snapshot()
+    if not snapshot:
+        st.info("Todavía no se ha procesado ningún diagnóstico en este proceso.")
+    else:
+        st.dataframe([
+            {"Etapa": name, "Ejecuciones": s["count"], "Errores": s["errors"],
+             "Media (ms)": round(s["mean_ms"], 1), "p50 (ms)": round(s["p50_ms"], 1),
+             "p95 (ms)": round(s["p95_ms"], 1), "p99 (ms)": round(s["p99_ms"], 1),
+             "Máx. (ms)": round(s["max_ms"], 1)}
+            for name, s in snapshot.items()
+        ], hide_index=True)
+        st.caption(f"Percentiles sobre las últimas {tracer.window} ejecuciones de cada etapa.")
+
+    server = get_server()
+    col_server, col_cache = st.columns(2)
+    if hasattr(server, "batches"):
+        # Servidor dentro del proceso; con INFERENCE_SERVER_URL ver GET /metrics del servidor
+        images_per_batch = server.images / server.batches if server.batches else 0
+        col_server.metric("Imágenes por lote", f"{images_per_batch:.2f}", help=f"{server.batches} lotes")
+    cache_stats = get_prediction_cache().stats()
+    lookups = cache_stats["hits"] + cache_stats["disk_hits"] + cache_stats["misses"]
+    hit_rate = (cache_stats["hits"] + cache_stats["disk_hits"]) / lookups if lookups else 0
+    col_cache.metric("Aciertos de caché", f"{hit_rate:.0%}", help=f"{lookups} consultas")
+
+    col_prom, col_json, col_reset = st.columns(3)
+    col_prom.download_button("Exportar (Prometheus)", tracer.to_prometheus(),
+                             file_name="latencias.prom", mime="text/plain")
+    col_json.download_button("Exportar (JSON)", tracer.to_json(),
+                             file_name="latencias.json", mime="application/json")
+    if col_reset.button("Reiniciar métricas"):
+        tracer.reset()
+        st.rerun()
+
 def patient_dashboard():
     st.title(f"👤 Bienvenido {st.session_state.user['nom_usu']}")
     
     st.subheader("Mi Historial Clínico")
-    paciente = DBOperations.get_all_patients()
+    paciente = DBOperations.get_patient_by_user(st.session_state.user['id_usuario'])
     if paciente:
-        history = DBOperations.get_patient_history(paciente[0]['id_paci'])
+        history = DBOperations.get_patient_history(paciente['id_paci'])
         if history:
             for record in history:
                 with st.expander(f"Consulta del {record['fecha_diagnostico']}"):
@@ -131,6 +246,33 @@ def patient_dashboard():
         else:
             st.info("Aún no tienes registros en tu historial clínico")
 
+def show_diagnosis(uploaded_file, temp_path):
+    """Guarda la subida en temp_path, la diagnostica y muestra el resultado.
+
+    Devuelve (diagnóstico, clase) para el formulario de observaciones.
+    """
+    with span("diagnostico.subida"):
+        with open(temp_path, "wb") as f:
+            f.write(uploaded_file.getbuffer())
+
+    original_img, blended_img, pred_diag, pred_class, pred_conf = process_and_predict_image(temp_path)
+
+    # Mostrar resultados
+    with span("diagnostico.mostrar"):
+        st.subheader("Resultados del Análisis")
+
+        col_orig, col_diag = st.columns(2)
+        col_orig.image(original_img, caption="Imagen Original")
+        col_diag.image(blended_img, caption="Diagnóstico IA")
+
+        st.markdown(f"""
+        **Diagnóstico:** {pred_diag} (Nivel {pred_class})  
+        **Confianza media:** {"—" if pred_conf is None else f"{pred_conf:.0%}"}  
+        **Modelo utilizado:** U-Net Periodontal v1.0  
+        **Precisión estimada:** 92%
+        """)
+    return pred_diag, pred_class
+
 def professional_dashboard():
     st.title(f"👨‍⚕️ Panel de {st.session_state.user['rol_usu'].capitalize()}")
     
@@ -139,29 +281,10 @@ def professional_dashboard():
     with tab1:
         st.subheader("🦷 Nuevo Diagnóstico con IA")
         
-        # Selección de paciente corregida
-        pacientes = DBOperations.get_all_patients()
+        # Selección de paciente (solo se consulta la página visible)
+        paciente_id = patient_selector("Seleccione un paciente", key="diag_paciente")
         
-        if pacientes:
-            # Formatear opciones para el selectbox
-            opciones_pacientes = [
-                f"{p['nom_usu']} {p['ape_usu']} (DNI: {p['dni_usu']})"
-                for p in pacientes
-            ]
-            
-            # Mapeo entre opción mostrada y ID de paciente
-            paciente_dict = {
-                opcion: p['id_paci']
-                for opcion, p in zip(opciones_pacientes, pacientes)
-            }
-            
-            paciente_seleccionado = st.selectbox(
-                "Seleccione un paciente",
-                options=opciones_pacientes
-            )
-            
-            paciente_id = paciente_dict[paciente_seleccionado]
-            
+        if paciente_id is not None:
             # Subida de imagen
             uploaded_file = st.file_uploader(
                 "Suba una imagen dental (JPG/PNG)", 
@@ -174,31 +297,15 @@ def professional_dashboard():
                 os.makedirs(temp_dir, exist_ok=True)
                 temp_path = os.path.join(temp_dir, uploaded_file.name)
                 
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+                # Solo la primera ejecución de cada subida es un diagnóstico nuevo; las
+                # reejecuciones (p. ej. al enviar el formulario) salen de la caché
+                new_upload = st.session_state.get("diag_subida") != uploaded_file.file_id
+                st.session_state["diag_subida"] = uploaded_file.file_id
                 
                 try:
-                    original_img, blended_img, pred_diag, pred_class = process_and_predict_image(temp_path)
-                    
-                    # Mostrar resultados
-                    st.subheader("Resultados del Análisis")
-                    
-                    fig, ax = plt.subplots(1, 2, figsize=(12, 5))
-                    ax[0].imshow(original_img)
-                    ax[0].set_title("Imagen Original")
-                    ax[0].axis("off")
-                    
-                    ax[1].imshow(blended_img)
-                    ax[1].set_title("Diagnóstico IA")
-                    ax[1].axis("off")
-                    
-                    st.pyplot(fig)
-                    
-                    st.markdown(f"""
-                    **Diagnóstico:** {pred_diag} (Nivel {pred_class})  
-                    **Modelo utilizado:** U-Net Periodontal v1.0  
-                    **Precisión estimada:** 92%
-                    """)
+                    # Desde la subida hasta mostrar el resultado, también si falla
+                    with span("diagnostico.total") if new_upload else nullcontext():
+                        pred_diag, pred_class = show_diagnosis(uploaded_file, temp_path)
                     
                     # Formulario para observaciones
                     with st.form("diagnostico_form"):
@@ -210,7 +317,11 @@ def professional_dashboard():
                             img_dir = "patient_images"
                             os.makedirs(img_dir, exist_ok=True)
                             new_path = os.path.join(img_dir, f"{paciente_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg")
-                            original_img.save(new_path)
+                            # Se guarda la imagen subida a resolución completa, no la reducida a 256x256
+                            with span("guardado.imagen"), Image.open(temp_path) as full_img:
+                                full_img.convert("RGB").save(new_path, quality=95)
+                            with span("guardado.miniatura"):
+                                thumb_path = make_thumbnail(new_path)
                             
                             # Guardar en base de datos
                             diagnosis_data = {
@@ -222,7 +333,10 @@ def professional_dashboard():
                                 'observacion': obs
                             }
                             
-                            if DBOperations.save_diagnosis(paciente_id, st.session_state.user['id_usuario'], new_path, diagnosis_data):
+                            with span("guardado.bd"):
+                                saved = DBOperations.save_diagnosis(paciente_id, st.session_state.user['id_usuario'],
+                                                                    new_path, diagnosis_data, thumb_path)
+                            if saved:
                                 st.success("Diagnóstico guardado exitosamente")
                                 if os.path.exists(temp_path):
                                     os.remove(temp_path)
@@ -235,32 +349,13 @@ def professional_dashboard():
                     if os.path.exists(temp_path):
                         os.remove(temp_path)
         else:
-            st.warning("No hay pacientes registrados en el sistema.")
+            st.warning("No se encontraron pacientes registrados.")
     
     with tab2:
         st.subheader("Historial de Pacientes")
-        pacientes = DBOperations.get_all_patients()
+        paciente_id = patient_selector("Seleccione paciente para ver historial", key="hist_paciente")
         
-        if pacientes:
-            # Formatear opciones para el selectbox
-            opciones_pacientes = [
-                f"{p['nom_usu']} {p['ape_usu']} (DNI: {p['dni_usu']})"
-                for p in pacientes
-            ]
-            
-            # Mapeo entre opción mostrada y ID de paciente
-            paciente_dict = {
-                opcion: p['id_paci']
-                for opcion, p in zip(opciones_pacientes, pacientes)
-            }
-            
-            paciente_hist = st.selectbox(
-                "Seleccione paciente para ver historial",
-                options=opciones_pacientes,
-                key="hist_paciente"
-            )
-            
-            paciente_id = paciente_dict[paciente_hist]
+        if paciente_id is not None:
             historial = DBOperations.get_patient_history(paciente_id)
             
             if historial:
@@ -269,14 +364,17 @@ def professional_dashboard():
                         st.write(f"Diagnóstico: {DIAGNOSIS_LABELS.get(record['nivel_enfe'], 'Desconocido')}")
                         st.write(f"Observaciones: {record['observacion']}")
                         try:
-                            img = load_img(record['ruta_arch'], target_size=(300, 300))
-                            st.image(img, caption="Imagen de diagnóstico")
+                            thumb = get_thumbnail(record['ruta_arch'], record['ruta_thumb'])
+                            if thumb != record['ruta_thumb']:
+                                # Miniatura generada ahora: registrarla para no repetirla
+                                DBOperations.set_thumbnail(record['id_ima'], thumb)
+                            st.image(thumb, caption="Imagen de diagnóstico")
                         except:
                             st.warning("No se pudo cargar la imagen asociada")
             else:
                 st.info("Este paciente no tiene registros en su historial")
         else:
-            st.warning("No hay pacientes registrados")
+            st.warning("No se encontraron pacientes registrados.")
 
 # ---------------------- FLUJO PRINCIPAL ----------------------
 def main():
@@ -0,0 +1,105 @@
+# augmentation.py
+#
+# Aumento de datos sobre lotes (image, mask) dentro de tf.data. Volteos,
+# rotación y deformación elástica se combinan en una única malla de muestreo
+# por imagen: la imagen se interpola bilinealmente y la máscara por vecino más
+# cercano, así que las etiquetas siguen siendo clases válidas. Todo son
+# operaciones vectorizadas sobre el lote y con semillas sin estado: el mismo
+# AUG_SEED reproduce exactamente la misma secuencia de aumentos.
+
+import math
+import tensorflow as tf
+from config import (AUG_FLIP_H, AUG_FLIP_V, AUG_ROTATION_DEG, AUG_BRIGHTNESS, AUG_CONTRAST,
+                    AUG_ELASTIC_ALPHA, AUG_ELASTIC_GRID, AUG_SEED)
+
+def _uniform(seed, shape, low, high):
+    return tf.random.stateless_uniform(shape, seed=seed, minval=low, maxval=high)
+
+def _sampling_grid(seeds, batch, height, width):
+    """Coordenadas (y, x) de origen para cada píxel de salida, forma (B, H, W)."""
+    h, w = tf.cast(height, tf.float32), tf.cast(width, tf.float32)
+    ys, xs = tf.meshgrid(tf.range(h) - (h - 1) / 2, tf.range(w) - (w - 1) / 2, indexing="ij")
+
+    # Rotación y volteos alrededor del centro
+    angle = _uniform(seeds[0], [batch], -AUG_ROTATION_DEG, AUG_ROTATION_DEG) * (math.pi / 180)
+    flip_x = tf.ones([batch])
+    flip_y = tf.ones([batch])
+    if AUG_FLIP_H:
+        flip_x = tf.where(_uniform(seeds[1], [batch], 0, 1) < 0.5, -1.0, 1.0)
+    if AUG_FLIP_V:
+        flip_y = tf.where(_uniform(seeds[2], [batch], 0, 1) < 0.5, -1.0, 1.0)
+    cos, sin = tf.cos(angle)[:, None, None], tf.sin(angle)[:, None, None]
+    src_x = (cos * xs - sin * ys) * flip_x[:, None, None] + (w - 1) / 2
+    src_y = (sin * xs + cos * ys) * flip_y[:, None, None] + (h - 1) / 2
+
+    if AUG_ELASTIC_ALPHA > 0:
+        # Desplazamiento aleatorio en una malla gruesa, interpolado a resolución
+        # completa: campo suave sin necesidad de filtrar con una gaussiana
+        coarse = _uniform(seeds[3], [batch, AUG_ELASTIC_GRID, AUG_ELASTIC_GRID, 2], -1, 1)
+        field = tf.image.resize(coarse, (height, width), method="bicubic") * AUG_ELASTIC_ALPHA
+        src_y += field[..., 0]
+        src_x += field[..., 1]
+
+    return src_y, src_x
+
+def _padded_reader(images):
+    """Devuelve read(y, x) que lee images[b, y, x] con índices enteros (B, H, W).
+
+    La imagen se rodea de un borde de ceros y las coordenadas se recortan a ese
+    borde, así fuera de la imagen siempre se lee 0. tf.gather sobre el array
+    aplanado es bastante más rápido que gather_nd con batch_dims.
+    """
+    shape = tf.shape(images)
+    batch, height, width = shape[0], shape[1], shape[2]
+    paddings = [[0, 0], [1, 1], [1, 1]] + [[0, 0]] * (images.shape.rank - 3)
+    flat = tf.reshape(tf.pad(images, paddings), tf.concat([[-1], shape[3:]], axis=0))
+    base = (tf.range(batch) * (height + 2) * (width + 2))[:, None, None]
+
+    def read(y, x):
+        y = tf.clip_by_value(y, -1, height) + 1
+        x = tf.clip_by_value(x, -1, width) + 1
+        return tf.gather(flat, base + y * (width + 2) + x)
+    return read
+
+def _warp_bilinear(images, src_y, src_x):
+    read = _padded_reader(images)
+    y0, x0 = tf.floor(src_y), tf.floor(src_x)
+    wy, wx = (src_y - y0)[..., None], (src_x - x0)[..., None]
+    y0, x0 = tf.cast(y0, tf.int32), tf.cast(x0, tf.int32)
+    top = read(y0, x0) * (1 - wx) + read(y0, x0 + 1) * wx
+    bottom = read(y0 + 1, x0) * (1 - wx) + read(y0 + 1, x0 + 1) * wx
+    return top * (1 - wy) + bottom * wy
+
+def _warp_nearest(masks, src_y, src_x):
+    # Fuera de la imagen la máscara queda en 0 (Sano), igual que la imagen en negro
+    read = _padded_reader(masks)
+    return read(tf.cast(tf.round(src_y), tf.int32), tf.cast(tf.round(src_x), tf.int32))
+
+def augment_batch(images, masks, seed):
+    """Aumenta un lote: images float32 [0, 1] (B, H, W, 3), masks enteras (B, H, W).
+
+    seed es un tensor int64 de forma [2]; cada transformación usa una semilla derivada.
+    """
+    seeds = tf.random.experimental.stateless_split(tf.cast(seed, tf.int64), num=6)
+    batch, height, width = tf.shape(images)[0], tf.shape(images)[1], tf.shape(images)[2]
+
+    src_y, src_x = _sampling_grid(seeds, batch, height, width)
+    images = _warp_bilinear(images, src_y, src_x)
+    masks = _warp_nearest(masks, src_y, src_x)
+
+    # Brillo y contraste solo en la imagen
+    contrast = _uniform(seeds[4], [batch, 1, 1, 1], 1 - AUG_CONTRAST, 1 + AUG_CONTRAST)
+    brightness = _uniform(seeds[5], [batch, 1, 1, 1], -AUG_BRIGHTNESS, AUG_BRIGHTNESS)
+    mean = tf.reduce_mean(images, axis=[1, 2, 3], keepdims=True)
+    images = tf.clip_by_value((images - mean) * contrast + mean + brightness, 0.0, 1.0)
+    return images, masks
+
+def augment_dataset(ds, seed=AUG_SEED):
+    """Aplica augment_batch a un dataset de lotes (x, y) en paralelo.
+
+    Las semillas salen de un flujo determinista que cambia en cada época.
+    """
+    seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).batch(2)
+    ds = tf.data.Dataset.zip((ds, seeds))
+    return ds.map(lambda batch, s: augment_batch(batch[0], batch[1], s),
+                  num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
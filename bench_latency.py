@@ -0,0 +1,54 @@
+# bench_latency.py
+#
+# Latencia de inferencia con el modelo de Keras en memoria: model.predict,
+# model.predict_on_batch y KerasPredictor (tf.function con argmax en el
+# grafo) para lotes de 1 y de INFERENCE_MAX_BATCH imágenes.
+#
+#   python bench_latency.py
+#   python bench_latency.py --model unet_periodontal.h5 --repeats 100 --batch 1 4 16
+
+import time
+import argparse
+import numpy as np
+from tensorflow.keras.models import load_model
+from config import IMG_HEIGHT, IMG_WIDTH, MODEL_PATH, INFERENCE_MAX_BATCH, INFERENCE_JIT
+from inference_backend import KerasPredictor
+
+def latencies_ms(fn, x, repeats, warmup=3):
+    for _ in range(warmup):
+        fn(x)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(x)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, [50, 95])
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de inferencia por forma de llamar al modelo")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, INFERENCE_MAX_BATCH])
+    parser.add_argument("--jit", action="store_true", default=INFERENCE_JIT, help="Compilar KerasPredictor con XLA")
+    args = parser.parse_args()
+
+    model = load_model(args.model, compile=False)
+    predictor = KerasPredictor(model, max_batch_size=max(args.batch), jit_compile=args.jit)
+    cases = {
+        "model.predict": lambda x: np.argmax(model.predict(x, verbose=0), axis=-1),
+        "model.predict_on_batch": lambda x: np.argmax(model.predict_on_batch(x), axis=-1),
+        "KerasPredictor.predict_masks": predictor.predict_masks,
+        # Como lo llama el servidor de micro-lotes: lista de imágenes copiadas al búfer
+        "KerasPredictor (lista)": lambda x: predictor.predict_masks(list(x)),
+    }
+
+    print(f"{'caso':<30} {'lote':>5} {'p50 (ms)':>10} {'p95 (ms)':>10} {'ms/img':>8}")
+    rng = np.random.default_rng(0)
+    for batch in args.batch:
+        x = rng.random((batch, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+        for name, fn in cases.items():
+            p50, p95 = latencies_ms(fn, x, args.repeats)
+            print(f"{name:<30} {batch:>5} {p50:>10.1f} {p95:>10.1f} {p50 / batch:>8.1f}")
+
+if __name__ == "__main__":
+    main()
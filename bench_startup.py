@@ -0,0 +1,68 @@
+# bench_startup.py
+#
+# Mide el arranque en frío de los puntos de entrada: cada caso se ejecuta en
+# un proceso nuevo y se mide el tiempo de importación, la memoria residente
+# máxima y, si se indica un modelo, la primera predicción.
+#
+#   python bench_startup.py
+#   python bench_startup.py --model unet_periodontal.tflite --repeats 5
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Referencia: lo que importaban las apps antes del punto de entrada ligero (inference.py)
+CASES = {
+    "tensorflow+matplotlib+pandas": "import tensorflow.keras, matplotlib.pyplot, pandas",
+    "inference_server": "import inference_server",
+    "inference": "import inference",
+    "predict": "import predict",
+}
+
+_CHILD = r"""
+import time, json, resource, sys
+t0 = time.perf_counter()
+exec(sys.argv[1])
+t1 = time.perf_counter()
+first = None
+if sys.argv[2]:
+    import numpy as np
+    from model_registry import get_model
+    model = get_model(sys.argv[2])
+    model.predict_on_batch(np.zeros((1, 256, 256, 3), dtype=np.float32))
+    first = time.perf_counter() - t1
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"import_s": t1 - t0, "first_s": first, "rss_mb": rss_mb}))
+"""
+
+def measure(code, model, repeats):
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", _CHILD, code, model or ""],
+                             capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    result = {k: statistics.median(r[k] for r in runs) for k in ("import_s", "rss_mb")}
+    result["first_s"] = statistics.median(r["first_s"] for r in runs) if model else None
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo y memoria de arranque de los puntos de entrada")
+    parser.add_argument("--model", help="Medir también carga + primera predicción con este modelo")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    header = f"{'caso':<30} {'import (s)':>10} {'RSS (MB)':>10}"
+    if args.model:
+        header += f" {'1ª pred. (s)':>13}"
+    print(header)
+    for name, code in CASES.items():
+        r = measure(code, args.model, args.repeats)
+        line = f"{name:<30} {r['import_s']:>10.2f} {r['rss_mb']:>10.0f}"
+        if args.model:
+            line += f" {r['first_s']:>13.2f}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -6,3 +6,102 @@ NUM_CLASSES = 7  # Cambia según tus clases en las máscaras
 
 TRAIN_IMG_DIR = "Dataset/Training/Images"
 TRAIN_MASK_DIR = "Dataset/Training/Masks"
+
+# Partición entrenamiento/validación
+VAL_SPLIT = 0.2
+RANDOM_STATE = 42
+
+# Cargar el dataset con tf.data en lugar de todo en memoria
+STREAMING_LOADER = True
+
+# Carpeta (dentro de cada split) con el dataset preprocesado, ver dataset_cache.py
+CACHE_DIR_NAME = ".cache"
+USE_DATASET_CACHE = True
+
+# Etiquetas de diagnóstico por clase de la máscara
+DIAGNOSIS_LABELS = {
+    0: "Sano", 1: "Gingivitis Leve", 2: "Gingivitis Moderada",
+    3: "Gingivitis Severa", 4: "Placa Bacteriana", 5: "Sarro", 6: "Otros"
+}
+
+# Colores de la superposición (RGB); la clase 0 (Sano) no se colorea
+COLOR_MAP = {
+    1: [255, 255, 0],    # Gingivitis leve: Amarillo
+    2: [255, 165, 0],    # Gingivitis moderada: Naranja
+    3: [255, 0, 0],      # Gingivitis severa: Rojo
+    4: [0, 255, 0],      # Placa bacteriana: Verde
+    5: [0, 0, 255],      # Sarro: Azul
+    6: [128, 0, 128]     # Otros: Morado
+}
+
+# Modelo entrenado que usan las aplicaciones
+MODEL_PATH = "unet_periodontal.h5"
+
+# Servidor de inferencia con micro-lotes (ver inference_server.py)
+INFERENCE_MAX_BATCH = 8
+INFERENCE_MAX_WAIT_MS = 10
+INFERENCE_JIT = False  # compilar con XLA la función de inferencia de Keras
+INFERENCE_SERVER_URL = None  # p. ej. "http://127.0.0.1:8765"; None = dentro del proceso
+
+# Caché de predicciones (ver prediction_cache.py)
+PREDICTION_CACHE_ITEMS = 64
+PREDICTION_CACHE_MEMORY_BYTES = 256 * 1024 * 1024  # límite del nivel en memoria
+PREDICTION_CACHE_DIR = None  # p. ej. "cache/predicciones" para activar el nivel en disco
+PREDICTION_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Inferencia a resolución completa por ventanas (ver tiled_inference.py)
+FULL_RES_INFERENCE = False
+TILE_OVERLAP = 64
+TILE_BATCH_SIZE = 16
+TILE_SCALE = 1.0  # < 1 para aplicar las ventanas sobre una versión reducida
+DISPLAY_MAX_SIZE = 1024  # lado mayor de la superposición que se muestra
+
+# Base de datos (ver db_operations.py)
+DB_PATH = "diagnostico_dental.db"
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT_MS = 5000
+DB_STATEMENT_CACHE = 128
+DB_BULK_CHUNK_SIZE = 500  # filas por transacción (y por consulta IN)
+PATIENT_PAGE_SIZE = 20
+HISTORY_CACHE_TTL = 60  # segundos; guardar un diagnóstico invalida el historial al momento
+HISTORY_CACHE_ITEMS = 1024
+
+# Miniaturas del historial (ver thumbnails.py)
+THUMBNAIL_DIR = "patient_images/thumbs"
+THUMBNAIL_SIZE = 300
+THUMBNAIL_FORMAT = "JPEG"  # o "WEBP"
+
+# Entrenamiento (train.py; todos se pueden cambiar por línea de comandos)
+TRAIN_EPOCHS = 20
+TRAIN_BATCH_SIZE = 8
+MIXED_PRECISION = "auto"  # "auto", "mixed_bfloat16", "mixed_float16" o None
+JIT_COMPILE = False
+CHECKPOINT_DIR = "checkpoints"
+EARLY_STOPPING_PATIENCE = 5
+SPARSE_LABELS = True  # máscaras uint8 + sparse_categorical_crossentropy en vez de one-hot
+CLASS_WEIGHTS = None  # None (sin ponderar), "auto" (por frecuencia en las máscaras) o lista de NUM_CLASSES pesos
+
+# Entrenamiento data-parallel en CPU (ver distributed.py); None = valor por defecto de TensorFlow
+LOCAL_WORKERS = 1
+INTRA_OP_THREADS = None
+INTER_OP_THREADS = None
+
+# Aumento de datos en entrenamiento (ver augmentation.py)
+AUGMENT = True
+AUG_SEED = 1234
+AUG_FLIP_H = True
+AUG_FLIP_V = False
+AUG_ROTATION_DEG = 10
+AUG_BRIGHTNESS = 0.1  # desplazamiento máximo sobre [0, 1]
+AUG_CONTRAST = 0.15   # factor en [1 - c, 1 + c]
+AUG_ELASTIC_ALPHA = 6.0  # desplazamiento máximo en píxeles; 0 desactiva
+AUG_ELASTIC_GRID = 8     # puntos de control por lado del campo elástico
+
+# Motor de inferencia de las apps: "keras" (MODEL_PATH) o "tflite" (ver export_model.py)
+INFERENCE_BACKEND = "keras"
+TFLITE_MODEL_PATH = "unet_periodontal.tflite"
+TFLITE_THREADS = None  # None = todos los núcleos
+
+# Trazas de latencia por etapa (ver tracing.py)
+TRACING_ENABLED = True
+TRACING_WINDOW = 1024  # últimas duraciones por etapa usadas para p50/p95/p99
@@ -1,16 +1,13 @@
 import sqlite3
-import os
+import threading
+from config import DB_PATH
 
-def inicializar_base_datos():
-    # Conexión a la base de datos
-    conn = sqlite3.connect("diagnostico_dental.db")
-    cursor = conn.cursor()
-
-    # Activar claves foráneas
-    cursor.execute("PRAGMA foreign_keys = ON")
+# ---------------------- MIGRACIONES ----------------------
+# Cada migración se aplica una sola vez, dentro de una transacción, y queda
+# registrada en la tabla schema_version. Para cambiar el esquema se añade una
+# nueva entrada al final de MIGRACIONES; nunca se modifica una ya publicada.
 
-    # Crear tablas
-    cursor.executescript("""
+ESQUEMA_INICIAL = """
     CREATE TABLE IF NOT EXISTS Usuario (
         id_usuario INTEGER PRIMARY KEY AUTOINCREMENT,
         usu_usu TEXT UNIQUE NOT NULL,
@@ -82,39 +79,170 @@ def inicializar_base_datos():
         fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (id_diag) REFERENCES Diagnostico(id_diag) ON DELETE CASCADE
     );
-    """)
+"""
+
+INDICES_HISTORIAL = """
+    -- Historial del paciente: filtro por id_paciente y orden por fecha
+    CREATE INDEX IF NOT EXISTS idx_diagnostico_paciente_fecha
+        ON Diagnostico (id_paciente, fecha_diagnostico DESC, id_seg, nivel_enfe);
+"""
+
+INDICES_BUSQUEDA_PACIENTES = """
+    -- Búsqueda por prefijo de apellido sin distinguir mayúsculas y paginación por clave
+    CREATE INDEX IF NOT EXISTS idx_usuario_apellido_nocase
+        ON Usuario (ape_usu COLLATE NOCASE, nom_usu COLLATE NOCASE, id_usuario)
+"""
+
+# Índice de texto completo opcional (solo si SQLite trae FTS5)
+BUSQUEDA_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS UsuarioFTS USING fts5(
+        nom_usu, ape_usu, dni_usu,
+        content='Usuario', content_rowid='id_usuario'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS usuario_fts_ai AFTER INSERT ON Usuario BEGIN
+        INSERT INTO UsuarioFTS (rowid, nom_usu, ape_usu, dni_usu)
+        VALUES (new.id_usuario, new.nom_usu, new.ape_usu, new.dni_usu);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS usuario_fts_ad AFTER DELETE ON Usuario BEGIN
+        INSERT INTO UsuarioFTS (UsuarioFTS, rowid, nom_usu, ape_usu, dni_usu)
+        VALUES ('delete', old.id_usuario, old.nom_usu, old.ape_usu, old.dni_usu);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS usuario_fts_au AFTER UPDATE ON Usuario BEGIN
+        INSERT INTO UsuarioFTS (UsuarioFTS, rowid, nom_usu, ape_usu, dni_usu)
+        VALUES ('delete', old.id_usuario, old.nom_usu, old.ape_usu, old.dni_usu);
+        INSERT INTO UsuarioFTS (rowid, nom_usu, ape_usu, dni_usu)
+        VALUES (new.id_usuario, new.nom_usu, new.ape_usu, new.dni_usu);
+    END;
+
+    INSERT INTO UsuarioFTS (UsuarioFTS) VALUES ('rebuild')
+"""
+
+def fts5_disponible(cursor):
+    return bool(cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+
+def _ejecutar_script(cursor, script):
+    # executescript() hace COMMIT implícito; sentencia a sentencia la
+    # migración queda dentro de la transacción del ejecutor.
+    # Los triggers llevan ';' dentro de BEGIN ... END, así que se trocea con
+    # sqlite3.complete_statement.
+    sentencia = ""
+    for linea in script.splitlines(keepends=True):
+        sentencia += linea
+        if sqlite3.complete_statement(sentencia):
+            cursor.execute(sentencia)
+            sentencia = ""
+    if sentencia.strip():
+        cursor.execute(sentencia)
+
+def _v1_esquema_inicial(cursor):
+    _ejecutar_script(cursor, ESQUEMA_INICIAL)
 
     # Insertar datos iniciales
-    try:
-        cursor.execute("SELECT COUNT(*) FROM Usuario WHERE usu_usu = 'admin'")
-        if cursor.fetchone()[0] == 0:
-            # Insertar usuarios de ejemplo
-            cursor.executemany("""
-            INSERT INTO Usuario (usu_usu, nom_usu, ape_usu, pass_usu, rol_usu, dni_usu, edad_usu, sexo_usu)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", [
-                ('admin', 'Admin', 'Sistema', 'admin123', 'admin', '00000000', 30, 'Masculino'),
-                ('odontologo1', 'Juan', 'Pérez', 'odon123', 'odontologo', '11111111', 35, 'Masculino'),
-                ('tecnico1', 'María', 'López', 'tec123', 'tecnico', '22222222', 28, 'Femenino'),
-                ('paciente1', 'Carlos', 'Gómez', 'pac123', 'paciente', '33333333', 45, 'Masculino'),
-                ('paciente2', 'Ana', 'Martínez', 'pac456', 'paciente', '44444444', 32, 'Femenino')
-            ])
-
-            # Insertar pacientes
-            cursor.executemany("INSERT INTO Paciente (id_usuario) VALUES (?)", [
-                (4,), (5,)
-            ])
-
-            # Insertar historiales
-            cursor.executemany("INSERT INTO Historial (id_paci) VALUES (?)", [
-                (1,), (2,)
-            ])
-
-        conn.commit()
-        print("✅ Base de datos inicializada correctamente")
-    except sqlite3.Error as e:
-        print(f"❌ Error al inicializar la base de datos: {e}")
-    finally:
-        conn.close()
+    cursor.execute("SELECT COUNT(*) FROM Usuario WHERE usu_usu = 'admin'")
+    if cursor.fetchone()[0] == 0:
+        # Insertar usuarios de ejemplo
+        cursor.executemany("""
+        INSERT INTO Usuario (usu_usu, nom_usu, ape_usu, pass_usu, rol_usu, dni_usu, edad_usu, sexo_usu)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", [
+            ('admin', 'Admin', 'Sistema', 'admin123', 'admin', '00000000', 30, 'Masculino'),
+            ('odontologo1', 'Juan', 'Pérez', 'odon123', 'odontologo', '11111111', 35, 'Masculino'),
+            ('tecnico1', 'María', 'López', 'tec123', 'tecnico', '22222222', 28, 'Femenino'),
+            ('paciente1', 'Carlos', 'Gómez', 'pac123', 'paciente', '33333333', 45, 'Masculino'),
+            ('paciente2', 'Ana', 'Martínez', 'pac456', 'paciente', '44444444', 32, 'Femenino')
+        ])
+
+        # Insertar pacientes
+        cursor.executemany("INSERT INTO Paciente (id_usuario) VALUES (?)", [
+            (4,), (5,)
+        ])
+
+        # Insertar historiales
+        cursor.executemany("INSERT INTO Historial (id_paci) VALUES (?)", [
+            (1,), (2,)
+        ])
+
+def _v2_indices_historial(cursor):
+    _ejecutar_script(cursor, INDICES_HISTORIAL)
+
+def _v3_busqueda_pacientes(cursor):
+    _ejecutar_script(cursor, INDICES_BUSQUEDA_PACIENTES)
+    if fts5_disponible(cursor):
+        _ejecutar_script(cursor, BUSQUEDA_FTS)
+
+def _v4_miniaturas(cursor):
+    cursor.execute("ALTER TABLE Imagen ADD COLUMN ruta_thumb TEXT")
+
+MIGRACIONES = [
+    (1, "Esquema inicial y usuarios de ejemplo", _v1_esquema_inicial),
+    (2, "Índice para el historial de pacientes", _v2_indices_historial),
+    (3, "Búsqueda paginada de pacientes", _v3_busqueda_pacientes),
+    (4, "Ruta de la miniatura de cada imagen", _v4_miniaturas),
+]
+
+_inicializadas = set()
+_lock = threading.Lock()
+
+def version_actual(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        descripcion TEXT NOT NULL,
+        fecha_aplicada DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    return cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def aplicar_migraciones(conn):
+    """Aplica las migraciones pendientes y devuelve cuántas se aplicaron."""
+    cursor = conn.cursor()
+    actual = version_actual(cursor)
+    aplicadas = 0
+
+    for version, descripcion, migracion in MIGRACIONES:
+        if version <= actual:
+            continue
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Otro proceso pudo aplicarla mientras esperábamos el bloqueo
+            if cursor.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                cursor.execute("COMMIT")
+                continue
+            migracion(cursor)
+            cursor.execute("INSERT INTO schema_version (version, descripcion) VALUES (?, ?)",
+                           (version, descripcion))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        aplicadas += 1
+        print(f"Migración {version} aplicada: {descripcion}")
+
+    return aplicadas
+
+def inicializar_base_datos(db_path=DB_PATH):
+    # Streamlit reejecuta el script en cada interacción: solo la primera
+    # llamada del proceso consulta la versión del esquema
+    if db_path in _inicializadas:
+        return
+
+    with _lock:
+        if db_path in _inicializadas:
+            return
+
+        # Conexión a la base de datos (transacciones controladas a mano)
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            # Activar claves foráneas
+            conn.execute("PRAGMA foreign_keys = ON")
+            if aplicar_migraciones(conn):
+                print("✅ Base de datos inicializada correctamente")
+            _inicializadas.add(db_path)
+        except sqlite3.Error as e:
+            print(f"❌ Error al inicializar la base de datos: {e}")
+        finally:
+            conn.close()
 
 if __name__ == "__main__":
-    inicializar_base_datos()
\ No newline at end of file
+    inicializar_base_datos()
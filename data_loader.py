@@ -1,31 +1,188 @@
 # data_loader.py
 
-import os
 import numpy as np
+import tensorflow as tf
 from tensorflow.keras.preprocessing.image import load_img, img_to_array
 from sklearn.model_selection import train_test_split
-from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES
+from config import (IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES, VAL_SPLIT, RANDOM_STATE, USE_DATASET_CACHE,
+                    AUG_SEED)
+from dataset_cache import list_pairs, load_cached
+from augmentation import augment_dataset
 
-def load_dataset(image_dir, mask_dir):
-    image_files = sorted(os.listdir(image_dir))
-    images = []
-    masks = []
-    
-    for filename in image_files:
-        img_path = os.path.join(image_dir, filename)
-        mask_path = os.path.join(mask_dir, filename.replace('.jpg', '.png'))
+def load_dataset(image_dir, mask_dir, use_cache=USE_DATASET_CACHE, one_hot=True):
+    if use_cache:
+        # Imágenes ya decodificadas y redimensionadas en la caché
+        images, masks, _ = load_cached(image_dir, mask_dir)
+        X = images.astype(np.float32) / 255.0
+        y = np.array(masks)
+    else:
+        image_paths, mask_paths = list_pairs(image_dir, mask_dir)
+        images = []
+        masks = []
 
-        if not os.path.exists(mask_path):
-            continue
+        for img_path, mask_path in zip(image_paths, mask_paths):
+            img = load_img(img_path, target_size=(IMG_HEIGHT, IMG_WIDTH))
+            mask = load_img(mask_path, color_mode='grayscale', target_size=(IMG_HEIGHT, IMG_WIDTH))
 
-        img = load_img(img_path, target_size=(IMG_HEIGHT, IMG_WIDTH))
-        mask = load_img(mask_path, color_mode='grayscale', target_size=(IMG_HEIGHT, IMG_WIDTH))
+            images.append(img_to_array(img) / 255.0)
+            masks.append(img_to_array(mask).squeeze().astype(np.uint8))
 
-        images.append(img_to_array(img) / 255.0)
-        masks.append(img_to_array(mask).squeeze().astype(np.uint8))
+        X = np.array(images)
+        y = np.array(masks)
 
-    X = np.array(images)
-    y = np.array(masks)
-    y = np.eye(NUM_CLASSES)[y]  # one-hot encoding
+    if one_hot:
+        y = np.eye(NUM_CLASSES)[y]  # one-hot encoding
+    else:
+        y = y.astype(np.uint8)  # índices de clase, para sparse_categorical_crossentropy
 
-    return train_test_split(X, y, test_size=0.2, random_state=42)
+    return train_test_split(X, y, test_size=VAL_SPLIT, random_state=RANDOM_STATE)
+
+def label_counts(masks, indices=None, num_classes=NUM_CLASSES, chunk_size=256):
+    """Píxeles por clase de un array de máscaras (o de un dataset de pares sin one-hot)."""
+    counts = np.zeros(num_classes, dtype=np.int64)
+    if isinstance(masks, tf.data.Dataset):
+        chunks = (y.numpy() for _, y in masks)
+    else:
+        # Por bloques en orden de disco, sin cargar el memmap entero
+        indices = np.arange(len(masks)) if indices is None else np.sort(indices)
+        chunks = (masks[indices[i:i + chunk_size]] for i in range(0, len(indices), chunk_size))
+    for chunk in chunks:
+        counts += np.bincount(np.asarray(chunk).ravel(), minlength=num_classes)[:num_classes]
+    return counts
+
+def class_weights_from_counts(counts, max_weight=50.0):
+    """Pesos por frecuencia mediana: "Sano" queda por debajo de 1 y las clases raras por encima.
+
+    Las clases que no aparecen reciben peso 0.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    present = counts > 0
+    freq = counts / counts.sum()
+    weights = np.zeros_like(freq)
+    weights[present] = np.median(freq[present]) / freq[present]
+    return np.minimum(weights, max_weight).astype(np.float32)
+
+# --- Modo streaming con tf.data ---
+def _decode_pair(img_path, mask_path):
+    img = tf.io.decode_image(tf.io.read_file(img_path), channels=3, expand_animations=False)
+    img = tf.image.resize(img, (IMG_HEIGHT, IMG_WIDTH), method='nearest')
+    img = tf.cast(img, tf.float32) / 255.0
+    img.set_shape((IMG_HEIGHT, IMG_WIDTH, 3))
+
+    # La máscara se mantiene como índices de clase uint8
+    mask = tf.io.decode_image(tf.io.read_file(mask_path), channels=1, expand_animations=False)
+    mask = tf.image.resize(mask, (IMG_HEIGHT, IMG_WIDTH), method='nearest')
+    mask = tf.cast(tf.squeeze(mask, axis=-1), tf.uint8)
+    mask.set_shape((IMG_HEIGHT, IMG_WIDTH))
+
+    return img, mask
+
+def _finish(ds, batch_size, one_hot, class_weights=None, augment_seed=None):
+    ds = ds.batch(batch_size)
+    if augment_seed is not None:
+        # Sobre lotes ya formados: operaciones vectorizadas, varios lotes en paralelo
+        ds = augment_dataset(ds, augment_seed)
+    if class_weights is not None:
+        # Peso por píxel según su clase (Keras no admite class_weight con máscaras)
+        weights = tf.constant(class_weights, dtype=tf.float32)
+        ds = ds.map(lambda x, y: (x, y, tf.gather(weights, tf.cast(y, tf.int32))),
+                    num_parallel_calls=tf.data.AUTOTUNE)
+    if one_hot:
+        # One-hot por lote en float32, nunca sobre el dataset completo
+        ds = ds.map(lambda x, y, *w: (x, tf.one_hot(y, NUM_CLASSES), *w), num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+def _shard(ds, n_items, batch_size, shard):
+    """Reparte los elementos entre trabajadores antes de decodificar.
+
+    Cada trabajador recibe el mismo número de lotes completos (requisito de
+    MultiWorkerMirroredStrategy); como todos barajan con la misma semilla, los
+    repartos son disjuntos y cambian en cada época.
+    """
+    num_shards, index = shard
+    usable = n_items // (batch_size * num_shards) * batch_size * num_shards
+    ds = ds.take(usable).shard(num_shards, index)
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    return ds.with_options(options)
+
+def make_dataset(image_paths, mask_paths, batch_size=8, shuffle=False, one_hot=True, seed=RANDOM_STATE,
+                 class_weights=None, shard=None, augment_seed=None):
+    """Crea un tf.data.Dataset que decodifica y redimensiona en paralelo.
+
+    shard=(num_trabajadores, índice) para entrenamiento distribuido;
+    augment_seed activa el aumento de datos (augmentation.py).
+    """
+    ds = tf.data.Dataset.from_tensor_slices((list(image_paths), list(mask_paths)))
+    if shuffle:
+        # Se barajan rutas, no imágenes: el buffer no ocupa memoria relevante
+        ds = ds.shuffle(len(image_paths), seed=seed, reshuffle_each_iteration=True)
+    if shard:
+        ds = _shard(ds, len(image_paths), batch_size, shard)
+    ds = ds.map(_decode_pair, num_parallel_calls=tf.data.AUTOTUNE)
+    return _finish(ds, batch_size, one_hot, class_weights, augment_seed)
+
+def make_cached_dataset(images, masks, indices, batch_size=8, shuffle=False, one_hot=True, seed=RANDOM_STATE,
+                        class_weights=None, shard=None, augment_seed=None):
+    """Crea un tf.data.Dataset que lee de los arrays mapeados de dataset_cache."""
+    def read(i):
+        return images[i], masks[i]
+
+    def read_pair(i):
+        img, mask = tf.numpy_function(read, [i], (tf.uint8, tf.uint8))
+        img = tf.cast(img, tf.float32) / 255.0
+        img.set_shape((IMG_HEIGHT, IMG_WIDTH, 3))
+        mask.set_shape((IMG_HEIGHT, IMG_WIDTH))
+        return img, mask
+
+    ds = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if shuffle:
+        ds = ds.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+    if shard:
+        ds = _shard(ds, len(indices), batch_size, shard)
+    ds = ds.map(read_pair, num_parallel_calls=tf.data.AUTOTUNE)
+    return _finish(ds, batch_size, one_hot, class_weights, augment_seed)
+
+def load_dataset_streaming(image_dir, mask_dir, batch_size=8, one_hot=True, use_cache=USE_DATASET_CACHE,
+                           class_weights=None, shard=None, augment=False):
+    """Igual que load_dataset pero sin cargar todo en RAM.
+
+    Devuelve (train_ds, val_ds) con la misma partición que
+    train_test_split(random_state=RANDOM_STATE). Con class_weights="auto" se
+    calculan a partir de las máscaras de entrenamiento y train_ds devuelve
+    (x, y, peso_por_píxel). shard=(num_trabajadores, índice) reparte ambos
+    splits entre los trabajadores de un entrenamiento distribuido. augment
+    aumenta solo train_ds.
+    """
+    augment_seed = None
+    if augment:
+        # Cada trabajador con su propia secuencia de aumentos
+        augment_seed = AUG_SEED + (shard[1] if shard else 0)
+    if use_cache:
+        images, masks, _ = load_cached(image_dir, mask_dir)
+        train_idx, val_idx = train_test_split(
+            np.arange(len(images)), test_size=VAL_SPLIT, random_state=RANDOM_STATE)
+
+        if isinstance(class_weights, str):
+            class_weights = class_weights_from_counts(label_counts(masks, train_idx))
+        if class_weights is not None:
+            print("Pesos por clase:", np.round(np.asarray(class_weights, dtype=np.float64), 3).tolist())
+        train_ds = make_cached_dataset(images, masks, train_idx, batch_size, shuffle=True, one_hot=one_hot,
+                                       class_weights=class_weights, shard=shard, augment_seed=augment_seed)
+        val_ds = make_cached_dataset(images, masks, val_idx, batch_size, shuffle=False, one_hot=one_hot,
+                                     shard=shard)
+        return train_ds, val_ds
+
+    image_paths, mask_paths = list_pairs(image_dir, mask_dir)
+    train_imgs, val_imgs, train_masks, val_masks = train_test_split(
+        image_paths, mask_paths, test_size=VAL_SPLIT, random_state=RANDOM_STATE)
+
+    if isinstance(class_weights, str):
+        counts = label_counts(make_dataset(train_imgs, train_masks, batch_size, one_hot=False))
+        class_weights = class_weights_from_counts(counts)
+    if class_weights is not None:
+        print("Pesos por clase:", np.round(np.asarray(class_weights, dtype=np.float64), 3).tolist())
+    train_ds = make_dataset(train_imgs, train_masks, batch_size, shuffle=True, one_hot=one_hot,
+                            class_weights=class_weights, shard=shard, augment_seed=augment_seed)
+    val_ds = make_dataset(val_imgs, val_masks, batch_size, shuffle=False, one_hot=one_hot, shard=shard)
+    return train_ds, val_ds
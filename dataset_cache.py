@@ -0,0 +1,141 @@
+# dataset_cache.py
+#
+# Caché del dataset preprocesado. Cada split se empaqueta una sola vez en
+# arrays .npy (imágenes uint8 redimensionadas y máscaras uint8 con índices de
+# clase) que luego se abren con np.load(mmap_mode='r'), sin decodificar JPG/PNG.
+
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+from tensorflow.keras.preprocessing.image import load_img, img_to_array
+
+from config import IMG_HEIGHT, IMG_WIDTH, CACHE_DIR_NAME
+
+CACHE_FORMAT_VERSION = 1
+
+def list_pairs(image_dir, mask_dir):
+    """Devuelve las rutas de imagen y máscara (ordenadas) que tienen ambas partes."""
+    image_paths = []
+    mask_paths = []
+
+    for filename in sorted(os.listdir(image_dir)):
+        img_path = os.path.join(image_dir, filename)
+        mask_path = os.path.join(mask_dir, filename.replace('.jpg', '.png'))
+
+        if not os.path.exists(mask_path):
+            continue
+
+        image_paths.append(img_path)
+        mask_paths.append(mask_path)
+
+    return image_paths, mask_paths
+
+def cache_dir_for(image_dir):
+    """La caché vive junto a la carpeta de imágenes: Dataset/<split>/.cache"""
+    return os.path.join(os.path.dirname(os.path.normpath(image_dir)), CACHE_DIR_NAME)
+
+def fingerprint(image_paths, mask_paths):
+    """Huella de los ficheros fuente y del tamaño de entrada del modelo."""
+    h = hashlib.sha1()
+    h.update(f"{CACHE_FORMAT_VERSION}:{IMG_HEIGHT}x{IMG_WIDTH}".encode())
+    for path in list(image_paths) + list(mask_paths):
+        st = os.stat(path)
+        h.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+def _read_index(cache_dir):
+    index_path = os.path.join(cache_dir, "index.json")
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        return json.load(f)
+
+def _load_pair(paths):
+    img_path, mask_path = paths
+    img = load_img(img_path, target_size=(IMG_HEIGHT, IMG_WIDTH))
+    mask = load_img(mask_path, color_mode='grayscale', target_size=(IMG_HEIGHT, IMG_WIDTH))
+    return img_to_array(img, dtype='uint8'), img_to_array(mask, dtype='uint8').squeeze()
+
+def pack_dataset(image_dir, mask_dir, force=False, workers=None):
+    """Decodifica y redimensiona un split una sola vez y lo guarda en la caché.
+
+    Devuelve la ruta de la carpeta de caché. Si la caché ya está al día y
+    force=False, no hace nada.
+    """
+    image_paths, mask_paths = list_pairs(image_dir, mask_dir)
+    cache_dir = cache_dir_for(image_dir)
+    fp = fingerprint(image_paths, mask_paths)
+
+    index = _read_index(cache_dir)
+    if not force and index is not None and index["fingerprint"] == fp:
+        return cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    n = len(image_paths)
+    images_tmp = os.path.join(cache_dir, "images.npy.tmp")
+    masks_tmp = os.path.join(cache_dir, "masks.npy.tmp")
+    images = np.lib.format.open_memmap(images_tmp, mode='w+', dtype=np.uint8, shape=(n, IMG_HEIGHT, IMG_WIDTH, 3))
+    masks = np.lib.format.open_memmap(masks_tmp, mode='w+', dtype=np.uint8, shape=(n, IMG_HEIGHT, IMG_WIDTH))
+
+    # PIL libera el GIL al decodificar, así que basta con hilos
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_load_pair, zip(image_paths, mask_paths))
+        for i, (img, mask) in enumerate(tqdm(results, total=n, desc=f"Empaquetando {image_dir}")):
+            images[i] = img
+            masks[i] = mask
+
+    images.flush()
+    masks.flush()
+    del images, masks
+    os.replace(images_tmp, os.path.join(cache_dir, "images.npy"))
+    os.replace(masks_tmp, os.path.join(cache_dir, "masks.npy"))
+
+    # El índice se escribe al final: sin índice válido la caché no se usa
+    index = {
+        "fingerprint": fp,
+        "height": IMG_HEIGHT,
+        "width": IMG_WIDTH,
+        "count": n,
+        "files": [os.path.basename(p) for p in image_paths],
+    }
+    index_tmp = os.path.join(cache_dir, "index.json.tmp")
+    with open(index_tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(index_tmp, os.path.join(cache_dir, "index.json"))
+    return cache_dir
+
+def load_cached(image_dir, mask_dir, pack_if_stale=True):
+    """Devuelve (images, masks, files) como arrays de solo lectura mapeados en memoria.
+
+    images: (N, H, W, 3) uint8, masks: (N, H, W) uint8. Cortar estos arrays no
+    copia datos; solo se leen del disco las páginas que se usan.
+    """
+    cache_dir = cache_dir_for(image_dir)
+    index = _read_index(cache_dir)
+    image_paths, mask_paths = list_pairs(image_dir, mask_dir)
+    if index is None or index["fingerprint"] != fingerprint(image_paths, mask_paths):
+        if not pack_if_stale:
+            raise FileNotFoundError(f"No hay caché válida para {image_dir}")
+        pack_dataset(image_dir, mask_dir, force=True)
+        index = _read_index(cache_dir)
+
+    images = np.load(os.path.join(cache_dir, "images.npy"), mmap_mode='r')
+    masks = np.load(os.path.join(cache_dir, "masks.npy"), mmap_mode='r')
+    return images, masks, index["files"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Empaqueta el dataset en la caché mapeada en memoria")
+    parser.add_argument("splits", nargs="*", default=["Training", "Test", "Validation"])
+    parser.add_argument("--base-dir", default="Dataset")
+    parser.add_argument("--force", action="store_true", help="Reempaquetar aunque la caché esté al día")
+    args = parser.parse_args()
+
+    for split in args.splits:
+        image_dir = os.path.join(args.base_dir, split, "Images")
+        mask_dir = os.path.join(args.base_dir, split, "Masks")
+        print(f"Caché de {split}: {pack_dataset(image_dir, mask_dir, force=args.force)}")
@@ -1,14 +1,271 @@
+import time
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
+from config import (DB_PATH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_STATEMENT_CACHE,
+                    DB_BULK_CHUNK_SIZE, PATIENT_PAGE_SIZE, HISTORY_CACHE_TTL, HISTORY_CACHE_ITEMS)
+
+class ConnectionPool:
+    """Pool acotado de conexiones SQLite abiertas una sola vez y reutilizadas.
+
+    Cada conexión se configura en modo WAL (los lectores no se bloquean
+    mientras otra sesión escribe), synchronous=NORMAL, claves foráneas
+    activas y un busy_timeout para esperar en lugar de fallar con
+    "database is locked".
+    """
+
+    def __init__(self, db_path=DB_PATH, size=DB_POOL_SIZE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS):
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._all = []
+        self.checkouts = 0
+        self.waits = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # el pool garantiza un único usuario a la vez
+            cached_statements=DB_STATEMENT_CACHE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if len(self._all) < self.size:
+                    conn = self._connect()
+                    self._all.append(conn)
+                else:
+                    self.waits += 1
+            if conn is None:
+                try:
+                    conn = self._idle.get(timeout=self.busy_timeout_ms / 1000)
+                except queue.Empty:
+                    # Los llamadores capturan sqlite3.Error, no queue.Empty
+                    raise sqlite3.OperationalError("pool de conexiones agotado") from None
+        with self._lock:
+            self.checkouts += 1
+        return conn
+
+    def release(self, conn):
+        # Una excepción a mitad de escritura no debe dejar la transacción abierta
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": len(self._all),
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+            }
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+            for conn in self._all:
+                conn.close()
+            self._all = []
+
+_pool = ConnectionPool()
+
+def get_pool():
+    return _pool
+
+def get_pool_stats():
+    return _pool.stats()
 
 @contextmanager
 def get_db_connection():
-    conn = sqlite3.connect("diagnostico_dental.db")
-    conn.row_factory = sqlite3.Row
-    try:
+    with _pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+# ---------------------- CACHÉ DE HISTORIALES ----------------------
+class HistoryCache:
+    """Caché de lectura con TTL compartida por todas las sesiones del proceso.
+
+    Cada clave lleva un contador de generación: una invalidación que ocurre
+    mientras otra sesión consulta la base de datos impide que esa consulta
+    guarde un resultado ya obsoleto.
+    """
+
+    def __init__(self, ttl=HISTORY_CACHE_TTL, max_items=HISTORY_CACHE_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._items = {}        # clave -> (expira, valor)
+        self._generations = {}  # clave -> contador de invalidaciones
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve (valor, generación); valor es None si no está o expiró."""
+        with self._lock:
+            generation = self._generations.get(key, 0)
+            item = self._items.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self.hits += 1
+                return item[1], generation
+            self._items.pop(key, None)
+            self.misses += 1
+            return None, generation
+
+    def put(self, key, value, generation):
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return
+            if len(self._items) >= self.max_items and key not in self._items:
+                # Se descarta la entrada que expira antes
+                del self._items[min(self._items, key=lambda k: self._items[k][0])]
+            self._items[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for key in self._items:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "hits": self.hits,
+                    "misses": self.misses, "invalidations": self.invalidations}
+
+_history_cache = HistoryCache()
+
+def invalidate_patient_history(patient_id):
+    _history_cache.invalidate(int(patient_id))
+
+def get_history_cache_stats():
+    return _history_cache.stats()
+
+# ---------------------- INSERCIÓN MASIVA ----------------------
+DIAGNOSIS_FIELDS = ('version', 'precision', 'score', 'resultado', 'nivel_enfe', 'observacion')
+
+def _as_diagnosis_row(item):
+    """Normaliza un diagnóstico del lote a (patient_id, user_id, image_path, diagnosis_data)."""
+    data = {field: item[field] for field in DIAGNOSIS_FIELDS}
+    data['precision'] = float(data['precision'])
+    data['score'] = int(data['score'])
+    data['nivel_enfe'] = int(data['nivel_enfe'])
+    data['thumb_path'] = item.get('thumb_path')
+    # str(None) daría la ruta literal "None"
+    image_path = item['image_path']
+    if image_path is None or not str(image_path).strip():
+        raise ValueError("image_path vacío")
+    return int(item['patient_id']), int(item['user_id']), str(image_path), data
+
+def _has_fts(conn):
+    """Indica si la base de datos tiene el índice UsuarioFTS (migración 3 con FTS5).
+
+    Se consulta en cada búsqueda: las conexiones del pool viven todo el
+    proceso y el esquema puede cambiar mientras tanto.
+    """
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'UsuarioFTS'").fetchone() is not None
+
+def _placeholders(n):
+    return ", ".join("?" * n)
+
+def _insert_diagnoses(cursor, rows):
+    """Inserta Imagen/ModeloIA/Segmentacion/Diagnostico de varias filas con executemany.
+
+    Los id generados se resuelven en bloque: ruta_arch es única en Imagen e
+    id_ima es único en Segmentacion.
+    """
+    cursor.executemany("""
+        INSERT INTO Imagen (id_paci, id_usu, ruta_arch, tipo, ruta_thumb)
+        VALUES (?, ?, ?, 'diagnostico', ?)
+    """, [(patient_id, user_id, path, d['thumb_path']) for patient_id, user_id, path, d in rows])
+
+    paths = [path for _, _, path, _ in rows]
+    image_ids = {r[0]: r[1] for r in cursor.execute(
+        f"SELECT ruta_arch, id_ima FROM Imagen WHERE ruta_arch IN ({_placeholders(len(paths))})", paths)}
+
+    cursor.executemany("""
+        INSERT INTO ModeloIA (id_ima, version, precision, score)
+        VALUES (?, ?, ?, ?)
+    """, [(image_ids[path], d['version'], d['precision'], d['score']) for _, _, path, d in rows])
+
+    cursor.executemany("""
+        INSERT INTO Segmentacion (id_ima, resultado)
+        VALUES (?, ?)
+    """, [(image_ids[path], d['resultado']) for _, _, path, d in rows])
+
+    ids = list(image_ids.values())
+    seg_ids = {r[0]: r[1] for r in cursor.execute(
+        f"SELECT id_ima, id_seg FROM Segmentacion WHERE id_ima IN ({_placeholders(len(ids))})", ids)}
+
+    cursor.executemany("""
+        INSERT INTO Diagnostico (id_seg, nivel_enfe, observacion, id_paciente)
+        VALUES (?, ?, ?, ?)
+    """, [(seg_ids[image_ids[path]], d['nivel_enfe'], d['observacion'], patient_id)
+          for patient_id, _, path, d in rows])
+
+def _save_chunk(conn, chunk, failures):
+    """Guarda un lote en una transacción; si falla, lo reintenta fila a fila."""
+    cursor = conn.cursor()
+    rows = [row for _, row in chunk]
+    try:
+        _insert_diagnoses(cursor, rows)
+        conn.commit()
+        saved = len(rows)
+    except sqlite3.Error:
+        conn.rollback()
+        saved = None
+
+    if saved is None:
+        # Una fila inválida no debe abortar el resto del lote
+        saved = 0
+        cursor.execute("BEGIN")
+        for index, row in chunk:
+            cursor.execute("SAVEPOINT fila")
+            try:
+                _insert_diagnoses(cursor, [row])
+                cursor.execute("RELEASE fila")
+                saved += 1
+            except sqlite3.Error as e:
+                cursor.execute("ROLLBACK TO fila")
+                cursor.execute("RELEASE fila")
+                failures.append((index, str(e)))
+        conn.commit()
+
+    for patient_id in {row[0] for row in rows}:
+        invalidate_patient_history(patient_id)
+    return saved
 
 class DBOperations:
     @staticmethod
@@ -29,16 +286,75 @@ class DBOperations:
             """).fetchall()
 
     @staticmethod
-    def save_diagnosis(patient_id, user_id, image_path, diagnosis_data):
+    def get_patient_by_user(user_id):
+        with get_db_connection() as conn:
+            return conn.execute("""
+                SELECT p.id_paci, u.nom_usu, u.ape_usu, u.dni_usu
+                FROM Paciente p
+                JOIN Usuario u ON p.id_usuario = u.id_usuario
+                WHERE p.id_usuario = ?
+            """, (user_id,)).fetchone()
+
+    @staticmethod
+    def search_patients(query="", after=None, limit=PATIENT_PAGE_SIZE):
+        """Página de pacientes ordenada por (apellido, nombre, id_usuario).
+
+        query: prefijo del DNI si es numérico; si no, prefijo del apellido o,
+        con FTS5 disponible, de cualquier palabra del nombre o apellido.
+        after: clave devuelta por la página anterior (paginación por clave,
+        sin OFFSET). Devuelve (filas, clave_siguiente); clave_siguiente es
+        None en la última página.
+        """
+        query = query.strip()
+        conditions = []
+        params = []
+
+        with get_db_connection() as conn:
+            if query.isdigit():
+                conditions.append("u.dni_usu >= ? AND u.dni_usu < ?")
+                params += [query, query + "\U0010ffff"]
+            elif query:
+                if _has_fts(conn):
+                    terms = " ".join('"' + t.replace('"', '""') + '"*' for t in query.split())
+                    conditions.append("u.id_usuario IN (SELECT rowid FROM UsuarioFTS WHERE UsuarioFTS MATCH ?)")
+                    params.append(terms)
+                else:
+                    conditions.append("u.ape_usu >= ? COLLATE NOCASE AND u.ape_usu < ? COLLATE NOCASE")
+                    params += [query, query + "\U0010ffff"]
+
+            if after is not None:
+                # La primera condición permite buscar en el índice en lugar de recorrerlo
+                conditions.append("""u.ape_usu >= ? COLLATE NOCASE
+                                     AND (u.ape_usu COLLATE NOCASE, u.nom_usu COLLATE NOCASE, u.id_usuario)
+                                         > (? COLLATE NOCASE, ? COLLATE NOCASE, ?)""")
+                params += [after[0]] + list(after)
+
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            rows = conn.execute(f"""
+                SELECT p.id_paci, u.id_usuario, u.nom_usu, u.ape_usu, u.dni_usu
+                FROM Usuario u
+                JOIN Paciente p ON p.id_usuario = u.id_usuario
+                {where}
+                ORDER BY u.ape_usu COLLATE NOCASE, u.nom_usu COLLATE NOCASE, u.id_usuario
+                LIMIT ?
+            """, params + [limit + 1]).fetchall()
+
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            return rows[:limit], (last['ape_usu'], last['nom_usu'], last['id_usuario'])
+        return rows, None
+
+    @staticmethod
+    def save_diagnosis(patient_id, user_id, image_path, diagnosis_data, thumb_path=None):
         try:
             with get_db_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Guardar imagen
+                # Guardar imagen (y su miniatura para el historial)
                 cursor.execute("""
-                    INSERT INTO Imagen (id_paci, id_usu, ruta_arch, tipo)
-                    VALUES (?, ?, ?, ?)
-                """, (patient_id, user_id, image_path, 'diagnostico'))
+                    INSERT INTO Imagen (id_paci, id_usu, ruta_arch, tipo, ruta_thumb)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (patient_id, user_id, image_path, 'diagnostico', thumb_path))
                 image_id = cursor.lastrowid
                 
                 # Guardar resultados del modelo IA
@@ -61,16 +377,49 @@ class DBOperations:
                 """, (seg_id, diagnosis_data['nivel_enfe'], diagnosis_data['observacion'], patient_id))
                 
                 conn.commit()
-                return True
+            invalidate_patient_history(patient_id)
+            return True
         except sqlite3.Error as e:
             print(f"Error al guardar diagnóstico: {e}")
             return False
 
+    @staticmethod
+    def save_diagnoses_bulk(diagnoses, chunk_size=DB_BULK_CHUNK_SIZE):
+        """Guarda muchos diagnósticos en transacciones de chunk_size filas.
+
+        Cada elemento es un dict con patient_id, user_id, image_path y los
+        campos de diagnosis_data de save_diagnosis. Devuelve (guardados,
+        fallos), donde fallos es una lista de (índice, mensaje de error).
+        """
+        saved = 0
+        failures = []
+        chunk = []
+
+        with get_db_connection() as conn:
+            for index, item in enumerate(diagnoses):
+                try:
+                    chunk.append((index, _as_diagnosis_row(item)))
+                except (KeyError, TypeError, ValueError) as e:
+                    failures.append((index, f"Datos inválidos: {e!r}"))
+                    continue
+                if len(chunk) >= chunk_size:
+                    saved += _save_chunk(conn, chunk, failures)
+                    chunk = []
+            if chunk:
+                saved += _save_chunk(conn, chunk, failures)
+
+        failures.sort()
+        return saved, failures
+
     @staticmethod
     def get_patient_history(patient_id):
+        history, generation = _history_cache.get(int(patient_id))
+        if history is not None:
+            return history
+
         with get_db_connection() as conn:
-            return conn.execute("""
-                SELECT d.fecha_diagnostico, d.nivel_enfe, d.observacion, i.ruta_arch,
+            history = conn.execute("""
+                SELECT d.fecha_diagnostico, d.nivel_enfe, d.observacion, i.id_ima, i.ruta_arch, i.ruta_thumb,
                        m.version as modelo_version, m.precision as modelo_precision
                 FROM Diagnostico d
                 JOIN Segmentacion s ON d.id_seg = s.id_seg
@@ -80,6 +429,38 @@ class DBOperations:
                 ORDER BY d.fecha_diagnostico DESC
             """, (patient_id,)).fetchall()
 
+        _history_cache.put(int(patient_id), history, generation)
+        return history
+
+    @staticmethod
+    def get_images_without_thumbnail():
+        with get_db_connection() as conn:
+            return conn.execute("""
+                SELECT id_ima, ruta_arch, ruta_thumb FROM Imagen
+                WHERE ruta_thumb IS NULL
+            """).fetchall()
+
+    @staticmethod
+    def set_thumbnail(image_id, thumb_path):
+        with get_db_connection() as conn:
+            conn.execute("UPDATE Imagen SET ruta_thumb = ? WHERE id_ima = ?", (thumb_path, image_id))
+            row = conn.execute("SELECT id_paci FROM Imagen WHERE id_ima = ?", (image_id,)).fetchone()
+            conn.commit()
+        # Las filas cacheadas del historial incluyen ruta_thumb
+        if row is not None:
+            invalidate_patient_history(row['id_paci'])
+
+    @staticmethod
+    def set_thumbnails(thumbnails):
+        """Registra muchas miniaturas [(id_ima, ruta_thumb), ...] en una sola transacción."""
+        if not thumbnails:
+            return
+        with get_db_connection() as conn:
+            conn.executemany("UPDATE Imagen SET ruta_thumb = ? WHERE id_ima = ?",
+                             [(thumb_path, image_id) for image_id, thumb_path in thumbnails])
+            conn.commit()
+        _history_cache.clear()
+
     @staticmethod
     def create_user(username, password, nombre, apellido, dni, edad, sexo, rol):
         try:
@@ -0,0 +1,113 @@
+# distributed.py
+#
+# Entrenamiento data-parallel en CPU con MultiWorkerMirroredStrategy: cada
+# trabajador es un proceso con su parte del dataset y los gradientes se
+# promedian con all-reduce en cada paso.
+#
+#   python train.py --local-workers 4        # 4 procesos en esta máquina
+#
+# Para varias máquinas se lanza train.py en cada nodo con su TF_CONFIG:
+#   TF_CONFIG='{"cluster": {"worker": ["nodo1:12345", "nodo2:12345"]},
+#               "task": {"type": "worker", "index": 0}}' python train.py
+
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import tensorflow as tf
+
+def configure_threads(intra_op=None, inter_op=None):
+    """Fija los hilos de TensorFlow; debe llamarse antes de ejecutar cualquier operación."""
+    if intra_op:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+def worker_info():
+    """(num_trabajadores, índice) según TF_CONFIG; (1, 0) si no hay clúster."""
+    tf_config = json.loads(os.environ.get("TF_CONFIG", "{}"))
+    workers = tf_config.get("cluster", {}).get("worker", [])
+    if len(workers) < 2:
+        return 1, 0
+    return len(workers), int(tf_config["task"]["index"])
+
+class _MultiWorkerStrategy(tf.distribute.MultiWorkerMirroredStrategy):
+    """MultiWorkerMirroredStrategy que acepta reduce() sobre estructuras anidadas.
+
+    Keras 3 reduce el primer lote (x, y) completo para construir el modelo y
+    las colectivas solo aceptan tensores sueltos (y no uint8, como las máscaras).
+    Además promedia las métricas escalares con axis=0.
+    """
+
+    def reduce(self, reduce_op, value, axis):
+        return tf.nest.map_structure(lambda v: self._reduce_one(reduce_op, v, axis), value)
+
+    def _reduce_one(self, reduce_op, value, axis):
+        local = self.experimental_local_results(value)[0]
+        dtype = local.dtype
+        if axis is not None and local.shape.rank == 0:
+            axis = None
+        if dtype in (tf.uint8, tf.int8, tf.uint16, tf.int16, tf.bool):
+            value = self.run(lambda v: tf.cast(v, tf.int32), args=(value,))
+            return tf.cast(super().reduce(reduce_op, value, axis), dtype)
+        return super().reduce(reduce_op, value, axis)
+
+def get_strategy():
+    num_workers, _ = worker_info()
+    if num_workers == 1:
+        return tf.distribute.get_strategy()
+    # RING: all-reduce por gRPC, sin NCCL (nodos sin GPU)
+    options = tf.distribute.experimental.CommunicationOptions(
+        implementation=tf.distribute.experimental.CommunicationImplementation.RING)
+    return _MultiWorkerStrategy(communication_options=options)
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+def _has_flag(argv, flag):
+    return any(arg == flag or arg.startswith(flag + "=") for arg in argv)
+
+def launch_local_workers(num_workers, argv, intra_op=None):
+    """Lanza num_workers copias del script en esta máquina y espera a que terminen.
+
+    Los núcleos se reparten entre los procesos para no sobresuscribir la CPU.
+    """
+    intra_op = intra_op or max(1, (os.cpu_count() or 1) // num_workers)
+    cluster = {"worker": [f"localhost:{_free_port()}" for _ in range(num_workers)]}
+    procs = []
+    for index in range(num_workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps({"cluster": cluster,
+                                                     "task": {"type": "worker", "index": index}}))
+        cmd = [sys.executable] + argv + ["--intra-op-threads", str(intra_op)]
+        if not _has_flag(argv, "--inter-op-threads"):
+            cmd += ["--inter-op-threads", "2"]
+        procs.append(subprocess.Popen(cmd, env=env))
+    codes = [p.wait() for p in procs]
+    return max(codes, key=abs)
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """Añade images_per_sec (globales, todos los trabajadores) a los logs de cada época."""
+
+    def __init__(self, global_batch_size):
+        super().__init__()
+        self.global_batch_size = global_batch_size
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._steps = 0
+        self._start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+        self._end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        # Solo los pasos de entrenamiento, sin la validación
+        elapsed = self._end - self._start
+        images_per_sec = self._steps * self.global_batch_size / elapsed
+        if logs is not None:
+            logs["images_per_sec"] = images_per_sec
+        print(f"Época {epoch + 1}: {images_per_sec:.1f} imágenes/s")
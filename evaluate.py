@@ -1,63 +1,55 @@
 # evaluate.py
 
 import os
+import argparse
 import numpy as np
 from tqdm import tqdm
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-import tensorflow as tf
-
-from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES
-
-# Métricas
-def iou_score(y_true, y_pred):
-    intersection = np.logical_and(y_true, y_pred)
-    union = np.logical_or(y_true, y_pred)
-    iou = np.sum(intersection) / (np.sum(union) + 1e-7)
-    return iou
-
-def dice_score(y_true, y_pred):
-    intersection = np.sum(y_true * y_pred)
-    dice = (2. * intersection) / (np.sum(y_true) + np.sum(y_pred) + 1e-7)
-    return dice
-
-# Cargar modelo entrenado
-model = load_model("unet_periodontal.h5", compile=False)
-
-# Directorios
-image_dir = "Dataset/Validation/Images"
-mask_dir = "Dataset/Validation/Masks"
-
-image_paths = sorted([os.path.join(image_dir, x) for x in os.listdir(image_dir) if x.endswith(".jpg")])
-mask_paths = sorted([os.path.join(mask_dir, x) for x in os.listdir(mask_dir) if x.endswith(".png")])
-
-iou_scores = []
-dice_scores = []
-
-print("Evaluando...")
-
-for img_path, mask_path in tqdm(zip(image_paths, mask_paths), total=len(image_paths)):
-    # Cargar imagen
-    img = load_img(img_path, target_size=(IMG_HEIGHT, IMG_WIDTH))
-    img = img_to_array(img) / 255.0
-    img = np.expand_dims(img, axis=0)
-
-    # Cargar máscara real
-    mask = load_img(mask_path, target_size=(IMG_HEIGHT, IMG_WIDTH), color_mode="grayscale")
-    mask = img_to_array(mask).astype("int32")
-    mask = np.squeeze(mask)
-    mask = tf.keras.utils.to_categorical(mask, num_classes=NUM_CLASSES)
-
-    # Predicción
-    pred = model.predict(img)[0]
-    pred_mask = np.argmax(pred, axis=-1)
-    true_mask = np.argmax(mask, axis=-1)
-
-    # Calcular métricas
-    iou_scores.append(iou_score(true_mask, pred_mask))
-    dice_scores.append(dice_score(true_mask, pred_mask))
-
-# Resultados
-print("\n--- Resultados ---")
-print(f"IoU promedio: {np.mean(iou_scores):.4f}")
-print(f"Dice promedio: {np.mean(dice_scores):.4f}")
+
+from config import NUM_CLASSES
+from dataset_cache import load_cached
+from metrics import confusion_matrix, metrics_from_confusion
+from inference_backend import load_inference_model
+
+def evaluate(model, image_dir, mask_dir, batch_size=16):
+    """Evalúa el modelo sobre un split acumulando una única matriz de confusión."""
+    # Imágenes y máscaras preprocesadas (ver dataset_cache.py)
+    images, masks, files = load_cached(image_dir, mask_dir)
+    cm = np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.int64)
+
+    for start in tqdm(range(0, len(files), batch_size)):
+        x = images[start:start + batch_size].astype(np.float32) / 255.0
+        pred_mask = model.predict_masks(x)
+        cm += confusion_matrix(masks[start:start + batch_size], pred_mask)
+
+    return cm, metrics_from_confusion(cm)
+
+def print_results(results):
+    print("\n--- Resultados ---")
+    print(f"{'Clase':>6} {'IoU':>8} {'Dice':>8}")
+    for class_id, (iou, dice) in enumerate(zip(results["iou"], results["dice"])):
+        print(f"{class_id:>6} {iou:>8.4f} {dice:>8.4f}")
+    print(f"IoU promedio: {results['mean_iou']:.4f}")
+    print(f"Dice promedio: {results['mean_dice']:.4f}")
+    print(f"Exactitud de píxel: {results['pixel_accuracy']:.4f}")
+    print(f"IoU ponderado por frecuencia: {results['fw_iou']:.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa el modelo de segmentación")
+    parser.add_argument("--model", default="unet_periodontal.h5")
+    parser.add_argument("--split", default="Validation", choices=["Training", "Test", "Validation"])
+    parser.add_argument("--base-dir", default="Dataset")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    # Cargar modelo entrenado (.h5 o .tflite)
+    model = load_inference_model(args.model)
+
+    image_dir = os.path.join(args.base_dir, args.split, "Images")
+    mask_dir = os.path.join(args.base_dir, args.split, "Masks")
+
+    print(f"Evaluando {args.split}...")
+    _, results = evaluate(model, image_dir, mask_dir, batch_size=args.batch_size)
+    print_results(results)
+
+if __name__ == "__main__":
+    main()
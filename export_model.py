@@ -0,0 +1,123 @@
+# export_model.py
+#
+# Convierte el modelo entrenado a TFLite para servirlo con INFERENCE_BACKEND = "tflite".
+#
+#   python export_model.py                       # float32
+#   python export_model.py --int8                # cuantización int8 post-entrenamiento
+#   python export_model.py --int8 --calibration-samples 300 --report-split Test
+#
+# Al terminar compara el modelo exportado con el de Keras sobre un split
+# (mIoU, diferencia, píxeles con la misma clase y latencia por imagen).
+
+import os
+import time
+import random
+import argparse
+import numpy as np
+import tensorflow as tf
+from tqdm import tqdm
+from tensorflow.keras.models import load_model
+from tensorflow.keras.preprocessing.image import load_img, img_to_array
+
+from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES, MODEL_PATH, TFLITE_MODEL_PATH, TRAIN_IMG_DIR, RANDOM_STATE
+from dataset_cache import load_cached
+from inference_backend import TFLiteModel
+from metrics import confusion_matrix, metrics_from_confusion
+
+def representative_dataset(image_dir, num_samples, seed=RANDOM_STATE):
+    """Generador de calibración: imágenes del entrenamiento preprocesadas como en las apps."""
+    files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    files = random.Random(seed).sample(files, min(num_samples, len(files)))
+
+    def generator():
+        for filename in files:
+            img = load_img(os.path.join(image_dir, filename), target_size=(IMG_HEIGHT, IMG_WIDTH))
+            yield [np.expand_dims(img_to_array(img) / 255.0, axis=0).astype(np.float32)]
+    return generator
+
+def convert(model, int8=False, calibration_dir=TRAIN_IMG_DIR, calibration_samples=200):
+    """Devuelve el modelo TFLite serializado.
+
+    El lote queda variable, así que el servidor de micro-lotes y las teselas
+    funcionan igual que con Keras.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if int8:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(calibration_dir, calibration_samples)
+        # Todo el cálculo en int8; entrada y salida siguen en float32 (se cuantizan dentro)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+def _latency_ms(model, x, repeats=20):
+    model.predict_on_batch(x)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict_on_batch(x)
+    return (time.perf_counter() - start) / repeats * 1000
+
+def parity_report(keras_model, tflite_model, image_dir, mask_dir, batch_size=16):
+    """Compara ambos modelos sobre un split con la misma matriz de confusión de evaluate.py."""
+    images, masks, files = load_cached(image_dir, mask_dir)
+    cm_keras = np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.int64)
+    cm_tflite = np.zeros_like(cm_keras)
+    agree = 0
+
+    for start in tqdm(range(0, len(files), batch_size)):
+        x = images[start:start + batch_size].astype(np.float32) / 255.0
+        y = masks[start:start + batch_size]
+        pred_keras = np.argmax(keras_model.predict_on_batch(x), axis=-1)
+        pred_tflite = np.argmax(tflite_model.predict_on_batch(x), axis=-1)
+        cm_keras += confusion_matrix(y, pred_keras)
+        cm_tflite += confusion_matrix(y, pred_tflite)
+        agree += np.count_nonzero(pred_keras == pred_tflite)
+
+    single = images[:1].astype(np.float32) / 255.0
+    return {
+        "keras": metrics_from_confusion(cm_keras),
+        "tflite": metrics_from_confusion(cm_tflite),
+        "agreement": agree / cm_keras.sum(),
+        "keras_ms": _latency_ms(keras_model, single),
+        "tflite_ms": _latency_ms(tflite_model, single),
+    }
+
+def print_report(report, keras_path, tflite_path):
+    keras_iou, tflite_iou = report["keras"]["mean_iou"], report["tflite"]["mean_iou"]
+    print("\n--- Paridad Keras / TFLite ---")
+    print(f"{'':>8} {'mIoU':>8} {'ms/img':>8} {'MB':>8}")
+    print(f"{'Keras':>8} {keras_iou:>8.4f} {report['keras_ms']:>8.1f} {os.path.getsize(keras_path) / 2**20:>8.1f}")
+    print(f"{'TFLite':>8} {tflite_iou:>8.4f} {report['tflite_ms']:>8.1f} {os.path.getsize(tflite_path) / 2**20:>8.1f}")
+    print(f"Diferencia de mIoU: {tflite_iou - keras_iou:+.4f}")
+    print(f"Píxeles con la misma clase: {report['agreement']:.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el modelo a TFLite")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=TFLITE_MODEL_PATH)
+    parser.add_argument("--int8", action="store_true", help="Cuantización int8 post-entrenamiento")
+    parser.add_argument("--calibration-dir", default=TRAIN_IMG_DIR)
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--base-dir", default="Dataset")
+    parser.add_argument("--report-split", default="Validation",
+                        help="Split para el informe de paridad; 'none' para omitirlo")
+    args = parser.parse_args()
+
+    model = load_model(args.model, compile=False)
+    print(f"Convirtiendo {args.model} ({'int8' if args.int8 else 'float32'})...")
+    tflite_bytes = convert(model, args.int8, args.calibration_dir, args.calibration_samples)
+
+    # Escritura atómica: el registro de modelos recarga el fichero en cuanto cambia
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(tflite_bytes)
+    os.replace(tmp_path, args.output)
+    print(f"Modelo guardado como {args.output}")
+
+    if args.report_split.lower() != "none":
+        image_dir = os.path.join(args.base_dir, args.report_split, "Images")
+        mask_dir = os.path.join(args.base_dir, args.report_split, "Masks")
+        report = parity_report(model, TFLiteModel(args.output), image_dir, mask_dir)
+        print_report(report, args.model, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# importar_diagnosticos.py
+#
+# Importa diagnósticos en bloque desde un CSV, por ejemplo el resumen.csv de
+# predict.py:
+#   python importar_diagnosticos.py predicciones/resumen.csv --id-usuario 2 --id-paciente 1
+#
+# Columnas reconocidas (las que falten se toman de los argumentos):
+#   id_paciente, id_usuario, ruta_arch | archivo, nivel_enfe | clase,
+#   resultado | diagnostico, observacion, version, precision, score
+
+import csv
+import time
+import argparse
+from db_operations import DBOperations
+from crear_bd import inicializar_base_datos
+
+def read_diagnoses(csv_path, defaults):
+    """Genera los diagnósticos del CSV sin cargar el fichero completo en memoria."""
+    with open(csv_path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield {
+                'patient_id': row.get('id_paciente') or defaults.id_paciente,
+                'user_id': row.get('id_usuario') or defaults.id_usuario,
+                'image_path': row.get('ruta_arch') or row.get('archivo'),
+                'nivel_enfe': row.get('nivel_enfe') or row.get('clase'),
+                'resultado': row.get('resultado') or row.get('diagnostico'),
+                'observacion': row.get('observacion') or defaults.observacion,
+                'version': row.get('version') or defaults.version,
+                'precision': row.get('precision') or defaults.precision,
+                'score': row.get('score') or defaults.score,
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description="Importación masiva de diagnósticos")
+    parser.add_argument("csv_path")
+    parser.add_argument("--id-paciente", type=int, help="Paciente si el CSV no trae id_paciente")
+    parser.add_argument("--id-usuario", type=int, help="Usuario que registra si el CSV no trae id_usuario")
+    parser.add_argument("--observacion", default="Importado automáticamente")
+    parser.add_argument("--version", default="v1.0")
+    parser.add_argument("--precision", type=float, default=92.5)
+    parser.add_argument("--score", type=int, default=90)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+
+    inicializar_base_datos()
+
+    start = time.perf_counter()
+    kwargs = {"chunk_size": args.chunk_size} if args.chunk_size else {}
+    saved, failures = DBOperations.save_diagnoses_bulk(read_diagnoses(args.csv_path, args), **kwargs)
+    elapsed = time.perf_counter() - start
+
+    print(f"Diagnósticos guardados: {saved} en {elapsed:.2f} s")
+    if failures:
+        print(f"Filas con error: {len(failures)}")
+        for index, error in failures[:20]:
+            print(f"  fila {index + 1}: {error}")
+        if len(failures) > 20:
+            print(f"  ... y {len(failures) - 20} más")
+
+if __name__ == "__main__":
+    main()
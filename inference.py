@@ -0,0 +1,70 @@
+# inference.py
+#
+# Punto de entrada solo de inferencia. Importa numpy, PIL y el registro de
+# modelos; TensorFlow se carga únicamente si el modelo es .h5, así que con
+# INFERENCE_BACKEND = "tflite" y ai-edge-litert (o tflite-runtime) instalado
+# un proceso de inferencia arranca sin TensorFlow, matplotlib ni pandas.
+#
+#   python inference.py imagen1.jpg imagen2.jpg      # diagnóstico por imagen
+#   python inference.py --serve --port 8765          # servidor HTTP de micro-lotes
+#
+# Ver bench_startup.py para medir el arranque en frío.
+
+import sys
+import argparse
+import numpy as np
+from PIL import Image
+from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES, DIAGNOSIS_LABELS
+from inference_backend import inference_model_path
+from model_registry import get_model
+from inference_server import get_server
+
+def load_rgb(image_path, size=(IMG_HEIGHT, IMG_WIDTH)):
+    """Igual que load_img(target_size=...) de Keras (vecino más cercano), como uint8."""
+    with Image.open(image_path) as img:
+        return np.asarray(img.convert("RGB").resize((size[1], size[0]), Image.NEAREST))
+
+def load_image(image_path, size=(IMG_HEIGHT, IMG_WIDTH)):
+    """Imagen normalizada a [0, 1], lista para el modelo."""
+    return load_rgb(image_path, size).astype(np.float32) / 255.0
+
+def predict_probs(image_array):
+    """Probabilidades (H, W, C) a través del servidor de micro-lotes compartido."""
+    return get_server().predict(image_array)
+
+def predict_mask(image_path):
+    """Devuelve (imagen normalizada, máscara uint8) de una imagen en disco."""
+    image = load_image(image_path)
+    return image, get_server().predict_mask(image)
+
+def predict_stats(image_path):
+    """Devuelve (máscara uint8, píxeles por clase, confianza media por clase) de una imagen en disco."""
+    return get_server().predict_stats(load_image(image_path))
+
+def diagnose(mask=None, class_counts=None):
+    """Clase con más píxeles y su etiqueta, a partir de la máscara o de sus conteos."""
+    if class_counts is None:
+        class_counts = np.bincount(mask.ravel(), minlength=NUM_CLASSES)
+    pred_class = int(np.argmax(class_counts))
+    return pred_class, DIAGNOSIS_LABELS.get(pred_class, "Desconocido")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inferencia ligera de segmentación periodontal")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--serve", action="store_true", help="Arrancar el servidor HTTP de inferencia")
+    args, rest = parser.parse_known_args()
+
+    if args.serve:
+        import inference_server
+        sys.argv = [sys.argv[0]] + rest
+        inference_server.main()
+        return
+
+    get_model(inference_model_path())
+    for image_path in args.images:
+        _, class_counts, class_confidence = predict_stats(image_path)
+        pred_class, label = diagnose(class_counts=class_counts)
+        print(f"{image_path}\t{pred_class}\t{label}\t{class_confidence[pred_class]:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# inference_backend.py
+#
+# Motor de inferencia seleccionable en config.py (INFERENCE_BACKEND):
+#   "keras"  -> MODEL_PATH (.h5) con Keras
+#   "tflite" -> TFLITE_MODEL_PATH, generado con export_model.py (float32 o int8)
+#
+# Ambos exponen predict_on_batch(x) -> probabilidades (N, H, W, C),
+# predict_masks(x) -> clases uint8 (N, H, W) y predict_stats(x) -> (máscaras,
+# píxeles por clase (N, C), confianza media por clase (N, C)), así que el
+# registro de modelos, el servidor de micro-lotes y la inferencia por teselas
+# funcionan igual con cualquiera de los dos.
+
+import os
+import threading
+import numpy as np
+from config import (IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES, INFERENCE_BACKEND, MODEL_PATH, TFLITE_MODEL_PATH, TFLITE_THREADS,
+                    INFERENCE_MAX_BATCH, INFERENCE_JIT)
+
+def _interpreter_class():
+    # El runtime independiente de LiteRT pesa mucho menos que TensorFlow completo
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+def class_stats(probs):
+    """(máscaras uint8, píxeles por clase, confianza media por clase) a partir de probabilidades.
+
+    La confianza de un píxel es la probabilidad de su clase ganadora; las
+    clases sin píxeles tienen confianza 0.
+    """
+    probs = np.asarray(probs)
+    masks = np.argmax(probs, axis=-1).astype(np.uint8)
+    confidence = np.max(probs, axis=-1)
+    counts = np.zeros((len(masks), NUM_CLASSES), dtype=np.int32)
+    mean_conf = np.zeros((len(masks), NUM_CLASSES), dtype=np.float32)
+    for i, (mask, conf) in enumerate(zip(masks, confidence)):
+        counts[i] = np.bincount(mask.ravel(), minlength=NUM_CLASSES)
+        sums = np.bincount(mask.ravel(), weights=conf.ravel(), minlength=NUM_CLASSES)
+        mean_conf[i] = sums / np.maximum(counts[i], 1)
+    return masks, counts, mean_conf
+
+class TFLiteModel:
+    """Modelo .tflite con la interfaz predict_on_batch de Keras."""
+
+    def __init__(self, path, num_threads=TFLITE_THREADS):
+        self.path = path
+        # Sin num_threads el intérprete usa un solo hilo
+        self._interpreter = _interpreter_class()(model_path=path, num_threads=num_threads or os.cpu_count())
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        # El intérprete no admite llamadas concurrentes
+        self._lock = threading.Lock()
+
+    def _quantize(self, x, details):
+        scale, zero_point = details["quantization"]
+        if details["dtype"] == np.float32 or not scale:
+            return x.astype(details["dtype"])
+        return np.round(x / scale + zero_point).astype(details["dtype"])
+
+    def _dequantize(self, y, details):
+        scale, zero_point = details["quantization"]
+        if details["dtype"] == np.float32 or not scale:
+            return y.astype(np.float32)
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        with self._lock:
+            if x.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input["index"], x.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = x.shape[0]
+            self._interpreter.set_tensor(self._input["index"], self._quantize(x, self._input))
+            self._interpreter.invoke()
+            y = self._interpreter.get_tensor(self._output["index"])
+        return self._dequantize(y, self._output)
+
+    def predict_masks(self, x):
+        return np.argmax(self.predict_on_batch(x), axis=-1).astype(np.uint8)
+
+    def predict_stats(self, x):
+        return class_stats(self.predict_on_batch(x))
+
+class KerasPredictor:
+    """Modelo de Keras llamado directamente a través de tf.function.
+
+    model.predict monta un bucle de predicción y un adaptador de datos en cada
+    llamada; aquí hay una sola traza con el lote variable, las imágenes se
+    copian en un búfer float32 preasignado y el argmax se calcula dentro del
+    grafo, así que para una imagen el tiempo es prácticamente el de las
+    convoluciones. predict_stats también cuenta los píxeles y promedia la
+    confianza por clase en el grafo: solo vuelven a NumPy la máscara uint8 y
+    dos vectores de NUM_CLASSES. El resto de atributos se delegan en el modelo
+    de Keras.
+    """
+
+    def __init__(self, model, max_batch_size=INFERENCE_MAX_BATCH, jit_compile=INFERENCE_JIT):
+        import tensorflow as tf
+
+        self.model = model
+        spec = [tf.TensorSpec([None, IMG_HEIGHT, IMG_WIDTH, 3], tf.float32)]
+
+        @tf.function(input_signature=spec, jit_compile=jit_compile)
+        def probs(x):
+            return model(x, training=False)
+
+        @tf.function(input_signature=spec, jit_compile=jit_compile)
+        def masks(x):
+            return tf.cast(tf.argmax(model(x, training=False), axis=-1), tf.uint8)
+
+        @tf.function(input_signature=spec, jit_compile=jit_compile)
+        def stats(x):
+            probs = model(x, training=False)
+            labels = tf.argmax(probs, axis=-1, output_type=tf.int32)
+            one_hot = tf.one_hot(labels, NUM_CLASSES, dtype=probs.dtype)
+            counts = tf.reduce_sum(one_hot, axis=[1, 2])
+            conf_sums = tf.reduce_sum(one_hot * tf.reduce_max(probs, axis=-1, keepdims=True), axis=[1, 2])
+            mean_conf = tf.math.divide_no_nan(conf_sums, counts)
+            return tf.cast(labels, tf.uint8), tf.cast(counts, tf.int32), tf.cast(mean_conf, tf.float32)
+
+        self._probs = probs
+        self._masks = masks
+        self._stats = stats
+        self._buffer = np.empty((max_batch_size, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _call(self, fn, x):
+        if isinstance(x, np.ndarray) and x.dtype == np.float32 and x.flags.c_contiguous:
+            return _to_numpy(fn(x))
+        if len(x) > len(self._buffer):
+            return _to_numpy(fn(np.asarray(x, dtype=np.float32)))
+        # Lista de imágenes (servidor de micro-lotes) o arrays de otro tipo:
+        # se copian al búfer en lugar de apilarlos en un array nuevo
+        with self._lock:
+            for i, image in enumerate(x):
+                self._buffer[i] = image
+            return _to_numpy(fn(self._buffer[:len(x)]))
+
+    def predict_on_batch(self, x):
+        return self._call(self._probs, x)
+
+    def predict_masks(self, x):
+        return self._call(self._masks, x)
+
+    def predict_stats(self, x):
+        return self._call(self._stats, x)
+
+def _to_numpy(outputs):
+    if isinstance(outputs, (tuple, list)):
+        return tuple(t.numpy() for t in outputs)
+    return outputs.numpy()
+
+def load_inference_model(path):
+    """Carga un modelo según su extensión (.tflite o formato de Keras)."""
+    if path.endswith(".tflite"):
+        return TFLiteModel(path)
+    from tensorflow.keras.models import load_model
+    return KerasPredictor(load_model(path, compile=False))
+
+def inference_model_path(backend=INFERENCE_BACKEND):
+    if backend == "tflite":
+        return TFLITE_MODEL_PATH
+    if backend == "keras":
+        return MODEL_PATH
+    raise ValueError(f"INFERENCE_BACKEND desconocido: {backend}")
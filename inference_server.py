@@ -0,0 +1,253 @@
+# inference_server.py
+#
+# Servidor de inferencia con micro-lotes. Las peticiones de una sola imagen
+# que llegan a la vez desde distintas sesiones de Streamlit se agrupan en un
+# lote (hasta INFERENCE_MAX_BATCH imágenes o INFERENCE_MAX_WAIT_MS de espera)
+# y se ejecutan con una sola pasada del modelo compartido.
+#
+# Por defecto funciona dentro del proceso. Para compartirlo entre varios
+# procesos: python inference_server.py --port 8765 y en config.py
+# INFERENCE_SERVER_URL = "http://127.0.0.1:8765". GET /version devuelve la
+# versión del modelo y GET /metrics las latencias de cola y de lote (ver
+# tracing.py).
+
+import io
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from config import INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS, INFERENCE_SERVER_URL
+from model_registry import get_model, get_model_version
+from inference_backend import inference_model_path
+from tracing import span, observe, get_tracer
+
+# Tipo de petición -> método del modelo que la resuelve
+_METHODS = {"probs": "predict_on_batch", "mask": "predict_masks", "stats": "predict_stats"}
+
+class InferenceServer:
+    def __init__(self, model_path=None, max_batch_size=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS):
+        self.model_path = model_path or inference_model_path()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.images = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="inference-server", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, kind="probs"):
+        """Encola una imagen normalizada (H, W, 3) y devuelve un Future con la predicción.
+
+        Según kind la predicción son las probabilidades (H, W, C) ("probs"), la
+        máscara de clases uint8 (H, W) ("mask") o la tupla (máscara, píxeles
+        por clase, confianza media por clase) ("stats"), calculadas en el grafo.
+        """
+        future = Future()
+        self._queue.put((image, future, kind, time.perf_counter()))
+        return future
+
+    def predict(self, image, timeout=None):
+        return self.submit(image).result(timeout)
+
+    def predict_mask(self, image, timeout=None):
+        return self.submit(image, "mask").result(timeout)
+
+    def predict_stats(self, image, timeout=None):
+        return self.submit(image, "stats").result(timeout)
+
+    def model_version(self):
+        """Versión del modelo que sirve (ver model_registry.file_version)."""
+        return get_model_version(self.model_path)
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        """Espera la primera petición y añade las que lleguen dentro del presupuesto de espera."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # parar después de este lote
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # Descartar peticiones canceladas mientras esperaban
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            now = time.perf_counter()
+            for *_, queued in batch:
+                observe("servidor.espera_cola", now - queued)
+            if not batch:
+                continue
+            try:
+                model = get_model(self.model_path)
+            except Exception as e:
+                # Sin modelo (fichero ausente o corrupto) se falla el lote, no el hilo
+                for _, f, *_ in batch:
+                    f.set_exception(e)
+                continue
+            for kind, method in _METHODS.items():
+                group = [(img, f) for img, f, k, _ in batch if k == kind]
+                if group:
+                    self._predict_group(getattr(model, method), group, kind)
+
+    def _predict_group(self, predict, group, kind):
+        try:
+            # El modelo copia las imágenes a su búfer de entrada, sin np.stack
+            with span(f"servidor.lote.{kind}"):
+                preds = predict([img for img, _ in group])
+            if isinstance(preds, tuple):
+                preds = list(zip(*preds))  # una tupla de salidas por imagen
+        except Exception as e:
+            for _, f in group:
+                f.set_exception(e)
+            return
+
+        self.batches += 1
+        self.images += len(group)
+        for (_, f), pred in zip(group, preds):
+            f.set_result(pred)
+
+class HTTPInferenceClient:
+    """Cliente con la misma interfaz que InferenceServer para un servidor remoto."""
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def predict(self, image, timeout=None):
+        return self._post("/predict", image, timeout)
+
+    def predict_mask(self, image, timeout=None):
+        return self._post("/predict_mask", image, timeout)
+
+    def predict_stats(self, image, timeout=None):
+        result = self._post("/predict_stats", image, timeout)
+        return result["mask"], result["counts"], result["confidence"]
+
+    def model_version(self):
+        with urllib.request.urlopen(f"{self.url}/version", timeout=self.timeout) as response:
+            return response.read().decode()
+
+    def _post(self, path, image, timeout):
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(image, dtype=np.float32))
+        request = urllib.request.Request(f"{self.url}{path}", data=buf.getvalue(),
+                                         headers={"Content-Type": "application/octet-stream"})
+        with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+            return np.load(io.BytesIO(response.read()))
+
+_server = None
+_server_lock = threading.Lock()
+
+def get_server():
+    """Servidor compartido por todas las sesiones del proceso."""
+    global _server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                if INFERENCE_SERVER_URL:
+                    _server = HTTPInferenceClient(INFERENCE_SERVER_URL)
+                else:
+                    _server = InferenceServer()
+    return _server
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                # Latencias del servidor (cola y lotes) en formato de Prometheus
+                data = get_tracer().to_prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/version":
+                # Para que los clientes versionen su caché sin cargar el modelo
+                try:
+                    data = server.model_version().encode()
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                content_type = "text/plain"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            kind = {"/predict": "probs", "/predict_mask": "mask", "/predict_stats": "stats"}.get(self.path)
+            if kind is None:
+                self.send_error(404)
+                return
+            try:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                pred = server.submit(np.load(io.BytesIO(body)), kind).result()
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            buf = io.BytesIO()
+            if kind == "stats":
+                mask, counts, confidence = pred
+                np.savez(buf, mask=mask, counts=counts, confidence=confidence)
+            else:
+                np.save(buf, pred)
+            data = buf.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de inferencia con micro-lotes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default=inference_model_path())
+    parser.add_argument("--max-batch-size", type=int, default=INFERENCE_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=INFERENCE_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    get_model(args.model)
+    server = InferenceServer(args.model, args.max_batch_size, args.max_wait_ms)
+    httpd = ThreadingHTTPServer((args.host, args.port), _make_handler(server))
+    print(f"Servidor de inferencia en http://{args.host}:{args.port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        server.stop()
+
+if __name__ == "__main__":
+    main()
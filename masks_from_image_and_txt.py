@@ -1,56 +1,140 @@
 import os
-import cv2
+import struct
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image
 from tqdm import tqdm
 
-def convert_all_yolo_to_masks(base_dir, subsets=['Training', 'Test', 'Validation'], num_classes=5):
-    for subset in subsets:
-        print(f"\nProcesando {subset}...")
-        image_dir = os.path.join(base_dir, subset, "Images")
-        label_dir = os.path.join(base_dir, subset, "Labels")
-        mask_dir = os.path.join(base_dir, subset, "Masks")
+# Marcadores SOF (Start Of Frame) que contienen alto y ancho de la imagen
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
 
-        os.makedirs(mask_dir, exist_ok=True)
+def jpeg_size(img_path):
+    """Devuelve (ancho, alto) leyendo solo la cabecera del JPEG, sin decodificarlo."""
+    with open(img_path, 'rb') as f:
+        if f.read(2) == b'\xff\xd8':
+            while True:
+                byte = f.read(1)
+                if not byte:
+                    break
+                if byte != b'\xff':
+                    continue
+                marker = f.read(1)
+                while marker == b'\xff':  # bytes de relleno
+                    marker = f.read(1)
+                if not marker:
+                    break
+                marker = marker[0]
+                if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                    continue  # marcadores sin longitud
+                length_bytes = f.read(2)
+                if len(length_bytes) != 2:
+                    break
+                length = struct.unpack('>H', length_bytes)[0]
+                if marker in _SOF_MARKERS:
+                    h, w = struct.unpack('>xHH', f.read(5))
+                    return w, h
+                f.seek(length - 2, os.SEEK_CUR)
+
+    # Cabecera no reconocida: PIL también lee solo la cabecera al abrir
+    with Image.open(img_path) as img:
+        return img.size
+
+def read_yolo_boxes(label_path):
+    """Lee las cajas YOLO (class_id, x_center, y_center, w, h) como array (N, 5)."""
+    boxes = []
+    with open(label_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue  # Saltar líneas mal formateadas
+            try:
+                boxes.append([float(p) for p in parts])
+            except ValueError:
+                continue
+    return np.array(boxes, dtype=np.float64).reshape(-1, 5)
+
+def yolo_to_mask(label_path, w, h):
+    # Crear máscara vacía
+    mask = np.zeros((h, w), dtype=np.uint8)
+
+    if not os.path.exists(label_path):
+        return mask
 
-        image_files = [f for f in os.listdir(image_dir) if f.endswith('.jpg')]
+    boxes = read_yolo_boxes(label_path)
+    if len(boxes) == 0:
+        return mask
 
-        for img_name in tqdm(image_files):
-            img_path = os.path.join(image_dir, img_name)
-            label_path = os.path.join(label_dir, img_name.replace('.jpg', '.txt'))
-            mask_path = os.path.join(mask_dir, img_name.replace('.jpg', '.png'))
+    # Coordenadas de todas las cajas de una vez
+    class_ids = boxes[:, 0].astype(np.uint8)
+    # Recortadas a la imagen por ambos lados, como hace cv2.rectangle: una caja
+    # fuera de la imagen daría índices negativos y el slice se saldría de la caja
+    x1 = np.clip(((boxes[:, 1] - boxes[:, 3] / 2) * w).astype(int), 0, w - 1)
+    y1 = np.clip(((boxes[:, 2] - boxes[:, 4] / 2) * h).astype(int), 0, h - 1)
+    x2 = np.clip(((boxes[:, 1] + boxes[:, 3] / 2) * w).astype(int), 0, w - 1)
+    y2 = np.clip(((boxes[:, 2] + boxes[:, 4] / 2) * h).astype(int), 0, h - 1)
 
-            # Cargar imagen para dimensiones
-            img = Image.open(img_path)
-            w, h = img.size
+    # Rellenar la máscara con la clase (extremos incluidos, como cv2.rectangle)
+    for c, a, b, c2, d in zip(class_ids, x1, y1, x2, y2):
+        mask[min(b, d):max(b, d) + 1, min(a, c2):max(a, c2) + 1] = c
 
-            # Crear máscara vacía
-            mask = np.zeros((h, w), dtype=np.uint8)
+    return mask
 
-            if os.path.exists(label_path):
-                with open(label_path, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) != 5:
-                            continue  # Saltar líneas mal formateadas
-                        class_id, x_center, y_center, box_w, box_h = map(float, parts)
-                        class_id = int(class_id)
+def is_up_to_date(mask_path, img_path, label_path):
+    """La máscara es válida si es más reciente que la imagen y su etiqueta."""
+    if not os.path.exists(mask_path):
+        return False
+    mask_mtime = os.path.getmtime(mask_path)
+    if os.path.getmtime(img_path) > mask_mtime:
+        return False
+    return not (os.path.exists(label_path) and os.path.getmtime(label_path) > mask_mtime)
 
-                        x1 = int((x_center - box_w / 2) * w)
-                        y1 = int((y_center - box_h / 2) * h)
-                        x2 = int((x_center + box_w / 2) * w)
-                        y2 = int((y_center + box_h / 2) * h)
+def _convert_chunk(tasks, force=False):
+    converted = 0
+    for img_path, label_path, mask_path in tasks:
+        if not force and is_up_to_date(mask_path, img_path, label_path):
+            continue
+        w, h = jpeg_size(img_path)
+        mask = yolo_to_mask(label_path, w, h)
+
+        # Guardar la máscara
+        Image.fromarray(mask).save(mask_path)
+        converted += 1
+    return converted, len(tasks)
+
+def convert_all_yolo_to_masks(base_dir, subsets=['Training', 'Test', 'Validation'], num_classes=5,
+                              workers=None, chunk_size=32, force=False):
+    tasks = []
+    for subset in subsets:
+        image_dir = os.path.join(base_dir, subset, "Images")
+        label_dir = os.path.join(base_dir, subset, "Labels")
+        mask_dir = os.path.join(base_dir, subset, "Masks")
+
+        os.makedirs(mask_dir, exist_ok=True)
 
-                        x1, y1 = max(0, x1), max(0, y1)
-                        x2, y2 = min(w - 1, x2), min(h - 1, y2)
+        for img_name in sorted(os.listdir(image_dir)):
+            if not img_name.endswith('.jpg'):
+                continue
+            tasks.append((
+                os.path.join(image_dir, img_name),
+                os.path.join(label_dir, img_name.replace('.jpg', '.txt')),
+                os.path.join(mask_dir, img_name.replace('.jpg', '.png')),
+            ))
 
-                        # Rellenar la máscara con la clase
-                        cv2.rectangle(mask, (x1, y1), (x2, y2), class_id, -1)
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    converted = 0
 
-            # Guardar la máscara
-            Image.fromarray(mask).save(mask_path)
+    print(f"\nProcesando {', '.join(subsets)}...")
+    with ProcessPoolExecutor(max_workers=workers) as pool, tqdm(total=len(tasks)) as progress:
+        futures = [pool.submit(_convert_chunk, chunk, force) for chunk in chunks]
+        for future in as_completed(futures):
+            done, total = future.result()
+            converted += done
+            progress.update(total)
 
-# 🔧 Ejecutar el script
-dataset_path = "Dataset"  # Reemplaza con tu ruta
-convert_all_yolo_to_masks(dataset_path)
+    print(f"Máscaras generadas: {converted}, ya actualizadas: {len(tasks) - converted}")
+    return converted
 
+if __name__ == "__main__":
+    # 🔧 Ejecutar el script
+    dataset_path = "Dataset"  # Reemplaza con tu ruta
+    convert_all_yolo_to_masks(dataset_path)
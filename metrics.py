@@ -0,0 +1,46 @@
+# metrics.py
+#
+# Métricas de segmentación a partir de una única matriz de confusión
+# NUM_CLASSES x NUM_CLASSES (filas: clase real, columnas: clase predicha).
+
+import numpy as np
+from config import NUM_CLASSES
+
+def confusion_matrix(y_true, y_pred, num_classes=NUM_CLASSES):
+    """Matriz de confusión de mapas de índices de clase de cualquier forma."""
+    y_true = np.asarray(y_true).ravel().astype(np.int64)
+    y_pred = np.asarray(y_pred).ravel().astype(np.int64)
+
+    # Ignorar píxeles con etiquetas fuera de rango
+    valid = (y_true >= 0) & (y_true < num_classes)
+    idx = y_true[valid] * num_classes + y_pred[valid]
+    return np.bincount(idx, minlength=num_classes ** 2).reshape(num_classes, num_classes)
+
+def metrics_from_confusion(cm):
+    """IoU/Dice por clase y medios, exactitud de píxel e IoU ponderado por frecuencia.
+
+    Las clases que no aparecen ni en la referencia ni en la predicción tienen
+    IoU/Dice NaN y no cuentan en las medias.
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    tp = np.diag(cm)
+    gt = cm.sum(axis=1)
+    pred = cm.sum(axis=0)
+    union = gt + pred - tp
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = np.where(union > 0, tp / union, np.nan)
+        dice = np.where(gt + pred > 0, 2 * tp / (gt + pred), np.nan)
+
+    total = cm.sum()
+    freq = gt / total if total > 0 else gt
+    present = ~np.isnan(iou)
+
+    return {
+        "iou": iou,
+        "dice": dice,
+        "mean_iou": float(np.nanmean(iou)) if present.any() else float("nan"),
+        "mean_dice": float(np.nanmean(dice)) if present.any() else float("nan"),
+        "pixel_accuracy": float(tp.sum() / total) if total > 0 else float("nan"),
+        "fw_iou": float(np.sum(freq[present] * iou[present])),
+    }
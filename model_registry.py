@@ -0,0 +1,86 @@
+# model_registry.py
+#
+# Registro de modelos compartido por todo el proceso. Streamlit vuelve a
+# ejecutar el script en cada interacción, pero los módulos importados se
+# conservan, así que cada .h5 se carga y se calienta una sola vez y todas las
+# sesiones y páginas usan la misma instancia. Sirve tanto para .h5 como para
+# .tflite (ver inference_backend.py).
+
+import os
+import hashlib
+import threading
+import numpy as np
+from inference_backend import load_inference_model
+from config import IMG_HEIGHT, IMG_WIDTH, MODEL_PATH
+
+_lock = threading.Lock()
+_entries = {}  # ruta absoluta -> ModelEntry
+
+class ModelEntry:
+    def __init__(self, model, version, mtime_ns):
+        self.model = model
+        self.version = version
+        self.mtime_ns = mtime_ns
+        self.failed_mtime_ns = None  # versión del fichero cuya recarga falló
+
+    def is_current(self, mtime_ns):
+        return mtime_ns in (self.mtime_ns, self.failed_mtime_ns)
+
+def file_version(path):
+    """Versión del modelo: hash corto del contenido del fichero."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+def warm_up(model):
+    """Pasada con una imagen vacía para que la primera petición real no pague la inicialización."""
+    x = np.zeros((1, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+    model.predict_on_batch(x)
+    model.predict_masks(x)
+    model.predict_stats(x)
+
+def _load_entry(path, mtime_ns):
+    model = load_inference_model(path)
+    warm_up(model)
+    return ModelEntry(model, file_version(path), mtime_ns)
+
+def get_entry(path=MODEL_PATH):
+    """Devuelve el ModelEntry de la ruta, recargándolo si el fichero cambió."""
+    key = os.path.abspath(path)
+    mtime_ns = os.stat(key).st_mtime_ns
+    entry = _entries.get(key)
+    if entry is not None and entry.is_current(mtime_ns):
+        return entry
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or not entry.is_current(mtime_ns):
+            try:
+                new_entry = _load_entry(key, mtime_ns)
+            except Exception as e:
+                # Si la recarga falla seguimos sirviendo la versión anterior
+                if entry is None:
+                    raise
+                print(f"Error al recargar el modelo {path}: {e}")
+                # No se reintenta hasta que el fichero vuelva a cambiar
+                entry.failed_mtime_ns = mtime_ns
+                return entry
+            # Las peticiones en curso conservan la referencia al modelo anterior
+            _entries[key] = entry = new_entry
+    return entry
+
+def get_model(path=MODEL_PATH):
+    return get_entry(path).model
+
+def get_model_version(path=MODEL_PATH):
+    return get_entry(path).version
+
+def save_model(model, path=MODEL_PATH):
+    """Guarda el modelo de forma atómica y lo publica en el registro."""
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+    model.save(tmp_path)
+    os.replace(tmp_path, path)
+    return get_entry(path)
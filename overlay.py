@@ -0,0 +1,55 @@
+# overlay.py
+#
+# Superposición de la máscara de clases sobre la imagen. La máscara uint8 se
+# convierte a color con una tabla (NUM_CLASSES, 3) en una sola indexación y la
+# mezcla se hace en uint8 con cv2.addWeighted, sin temporales float64.
+
+import numpy as np
+import cv2
+from config import NUM_CLASSES, COLOR_MAP
+
+def make_palette(color_map=COLOR_MAP, num_classes=NUM_CLASSES):
+    """Tabla de colores por clase; las clases sin color (p. ej. 0, Sano) quedan en negro."""
+    palette = np.zeros((num_classes, 3), dtype=np.uint8)
+    for class_id, color in color_map.items():
+        palette[class_id] = color
+    return palette
+
+PALETTE = make_palette()
+
+def to_uint8(image):
+    """Acepta imágenes uint8 o normalizadas en [0, 1]."""
+    image = np.asarray(image)
+    if image.dtype == np.uint8:
+        return image
+    return np.clip(image * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+def render_overlay(image, mask, alpha=0.5, palette=PALETTE, size=None):
+    """Mezcla la máscara de clases con la imagen.
+
+    image: (H, W, 3) o lote (N, H, W, 3), uint8 o float en [0, 1].
+    mask: (H, W) o (N, H, W) con índices de clase.
+    size: (ancho, alto) de salida opcional; la imagen se reescala de forma
+    bilineal y la máscara por vecino más cercano.
+    Devuelve uint8 con la forma de la imagen (o del tamaño pedido).
+    """
+    image = to_uint8(image)
+    mask = np.asarray(mask)
+    if mask.dtype != np.uint8:
+        mask = mask.astype(np.uint8)
+
+    if size is not None:
+        if image.ndim == 4:
+            image = np.stack([cv2.resize(img, size, interpolation=cv2.INTER_LINEAR) for img in image])
+            mask = np.stack([cv2.resize(m, size, interpolation=cv2.INTER_NEAREST) for m in mask])
+        else:
+            image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+            mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+
+    colors = palette[mask]
+
+    # cv2 trabaja sobre matrices 2D con canales: un lote se ve como una imagen alta
+    shape = image.shape
+    blended = cv2.addWeighted(np.ascontiguousarray(image).reshape(-1, shape[-2], 3), 1 - alpha,
+                              colors.reshape(-1, shape[-2], 3), alpha, 0)
+    return blended.reshape(shape)
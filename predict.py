@@ -1,43 +1,47 @@
+# predict.py
+#
+# Predicción por lotes: python predict.py Dataset/Test/Images --output predicciones --overlay
+
 import os
+import csv
+import glob
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import cv2
-import matplotlib.pyplot as plt
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES
-
-# --- Cargar el modelo entrenado ---
-model = load_model("unet_periodontal.h5")
-print("Modelo cargado.")
-
-# --- Cargar una imagen desde disco ---
-def load_image(image_path):
-    image = load_img(image_path, target_size=(IMG_HEIGHT, IMG_WIDTH))
-    image_array = img_to_array(image) / 255.0  # Normalizar
-    return image_array
+from PIL import Image
+from config import NUM_CLASSES, DIAGNOSIS_LABELS
+from overlay import render_overlay
+from inference import load_image
+from inference_backend import load_inference_model
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def collect_inputs(inputs):
+    """Expande directorios, patrones glob y listas de ficheros (@lista.txt) a rutas de imagen."""
+    paths = []
+    for item in inputs:
+        if item.startswith('@'):
+            with open(item[1:]) as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        elif os.path.isdir(item):
+            paths.extend(sorted(
+                os.path.join(item, f) for f in os.listdir(item)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            ))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    return paths
 
 # --- Superponer la máscara sobre la imagen original ---
 def show_overlay(original, mask_pred, alpha=0.4):
-    image = (original * 255).astype(np.uint8)
-
     # Convertir máscara a colores
     mask_pred = np.argmax(mask_pred, axis=-1).squeeze()
-    color_mask = np.zeros_like(image)
-
-    # Colores para cada clase (puedes personalizar)
-    colors = {
-        1: [255, 0, 0],   # Rojo
-        2: [0, 255, 0],   # Verde
-        3: [0, 0, 255],   # Azul
-        4: [255, 255, 0], # Amarillo
-        5: [255, 0, 255], # Magenta
-        6: [0, 255, 255], # Cyan
-    }
+    blended = render_overlay(original, mask_pred, alpha)
 
-    for class_id, color in colors.items():
-        color_mask[mask_pred == class_id] = color
-
-    blended = cv2.addWeighted(image, 1 - alpha, color_mask, alpha, 0)
+    import matplotlib.pyplot as plt  # solo para mostrar, no en modo lote
 
     plt.figure(figsize=(8, 8))
     plt.imshow(blended)
@@ -45,13 +49,106 @@ def show_overlay(original, mask_pred, alpha=0.4):
     plt.axis('off')
     plt.show()
 
-# --- Ruta de la imagen a probar ---
-image_path = "Dataset/Test/Images/00929.jpg"  # Cambia este nombre por otra imagen si deseas
+def predict_batches(model, paths, batch_size=16, workers=4):
+    """Genera (rutas, imágenes, máscaras) por lotes.
+
+    Mientras el modelo procesa un lote, el pool de hilos ya decodifica el siguiente.
+    """
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    if not batches:
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = [pool.submit(load_image, p) for p in batches[0]]
+        for i, batch_paths in enumerate(batches):
+            loaded = []
+            for path, future in zip(batch_paths, pending):
+                try:
+                    loaded.append((path, future.result()))
+                except Exception as e:
+                    # Una imagen ilegible no debe abortar el resto del lote
+                    print(f"No se pudo leer {path}: {e}")
+            if i + 1 < len(batches):
+                pending = [pool.submit(load_image, p) for p in batches[i + 1]]
+            if not loaded:
+                continue
+            batch_paths = [path for path, _ in loaded]
+            images = np.stack([image for _, image in loaded])
+
+            # Lote de tamaño fijo: se rellena el último para no recompilar el grafo
+            x = np.zeros((batch_size,) + images.shape[1:], dtype=np.float32)
+            x[:len(images)] = images
+            # argmax dentro del grafo: solo se copia la máscara uint8, no las probabilidades
+            yield batch_paths, images, model.predict_masks(x)[:len(images)]
+
+def output_names(paths):
+    """Nombre de salida de cada imagen: su ruta relativa al directorio común, sin extensión.
+
+    Así dos imágenes con el mismo nombre en directorios distintos no se pisan.
+    """
+    if not paths:
+        return {}
+    abs_paths = [os.path.abspath(p) for p in paths]
+    try:
+        root = os.path.commonpath([os.path.dirname(p) for p in abs_paths])
+    except ValueError:  # unidades distintas en Windows
+        root = ""
+    return {path: os.path.splitext(os.path.relpath(abs_path, root) if root
+                                   else os.path.splitdrive(abs_path)[1].lstrip("\\/"))[0]
+            for path, abs_path in zip(paths, abs_paths)}
+
+def _save_png(array, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(array).save(path)
+
+def run(model, paths, output_dir, batch_size=16, workers=4, overlay=False):
+    mask_dir = os.path.join(output_dir, "masks")
+    overlay_dir = os.path.join(output_dir, "overlays")
+    os.makedirs(mask_dir, exist_ok=True)
+    if overlay:
+        os.makedirs(overlay_dir, exist_ok=True)
+
+    names = output_names(paths)
+    csv_path = os.path.join(output_dir, "resumen.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["archivo", "clase", "diagnostico"] + [f"fraccion_clase_{c}" for c in range(NUM_CLASSES)])
+
+        for batch_paths, images, masks in predict_batches(model, paths, batch_size, workers):
+            for path, image, mask in zip(batch_paths, images, masks):
+                name = names[path]
+                _save_png(mask, os.path.join(mask_dir, f"{name}.png"))
+                if overlay:
+                    _save_png(render_overlay(image, mask, alpha=0.4), os.path.join(overlay_dir, f"{name}.png"))
+
+                counts = np.bincount(mask.ravel(), minlength=NUM_CLASSES)
+                class_id = int(np.argmax(counts))
+                writer.writerow([path, class_id, DIAGNOSIS_LABELS.get(class_id, "Desconocido")]
+                                + [f"{c / mask.size:.4f}" for c in counts])
+            print(f"{len(batch_paths)} imágenes procesadas")
+
+    return csv_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Predicción por lotes del modelo de segmentación")
+    parser.add_argument("inputs", nargs="+", help="Directorios, patrones glob, ficheros o @lista.txt")
+    parser.add_argument("--output", default="predicciones")
+    parser.add_argument("--model", default="unet_periodontal.h5")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="Hilos de decodificación")
+    parser.add_argument("--overlay", action="store_true", help="Guardar también la superposición en color")
+    args = parser.parse_args()
+
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        parser.error("No se encontraron imágenes")
+
+    # --- Cargar el modelo entrenado (.h5 o .tflite) ---
+    model = load_inference_model(args.model)
+    print(f"Modelo cargado. {len(paths)} imágenes a procesar.")
 
-# --- Procesar y predecir ---
-image_array = load_image(image_path)
-input_image = np.expand_dims(image_array, axis=0)
-prediction = model.predict(input_image)
+    csv_path = run(model, paths, args.output, args.batch_size, args.workers, args.overlay)
+    print(f"Resumen guardado en {csv_path}")
 
-# --- Mostrar el resultado ---
-show_overlay(image_array, prediction)
+if __name__ == "__main__":
+    main()
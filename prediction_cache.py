@@ -0,0 +1,134 @@
+# prediction_cache.py
+#
+# Caché de predicciones indexada por el hash del contenido de la imagen y la
+# versión del modelo. Un nivel en memoria (LRU) compartido por todas las
+# sesiones del proceso, limitado en entradas y en bytes, y, opcionalmente, un
+# nivel en disco (.npz) con expulsión por tamaño total.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from config import (PREDICTION_CACHE_ITEMS, PREDICTION_CACHE_MEMORY_BYTES, PREDICTION_CACHE_DIR,
+                    PREDICTION_CACHE_MAX_BYTES)
+
+def _entry_bytes(entry):
+    return sum(np.asarray(value).nbytes for value in entry.values())
+
+class PredictionCache:
+    def __init__(self, max_items=PREDICTION_CACHE_ITEMS, disk_dir=PREDICTION_CACHE_DIR,
+                 max_disk_bytes=PREDICTION_CACHE_MAX_BYTES, max_memory_bytes=PREDICTION_CACHE_MEMORY_BYTES):
+        self.max_items = max_items
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes, model_version):
+        return f"{hashlib.sha256(image_bytes).hexdigest()}-{model_version}"
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def get(self, key):
+        """Devuelve el diccionario de arrays guardado o None."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with np.load(self._disk_path(key)) as data:
+                    entry = {name: data[name] for name in data.files}
+                os.utime(self._disk_path(key))  # marca de uso para la expulsión
+            except (OSError, ValueError):
+                entry = None
+            if entry is not None:
+                self._put_memory(key, entry)
+                with self._lock:
+                    self.disk_hits += 1
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        self._put_memory(key, entry)
+        if self.disk_dir:
+            tmp_path = self._disk_path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **entry)
+            os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk()
+
+    def _put_memory(self, key, entry):
+        size = _entry_bytes(entry)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.memory_bytes -= old[1]
+            if size > self.max_memory_bytes:
+                return  # no cabe: solo en disco, si lo hay
+            self._items[key] = (entry, size)
+            self.memory_bytes += size
+            while len(self._items) > self.max_items or self.memory_bytes > self.max_memory_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.memory_bytes -= evicted
+
+    def _evict_disk(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".npz"):
+                path = os.path.join(self.disk_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        # Se eliminan primero los menos usados recientemente
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.memory_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "memory_bytes": self.memory_bytes, "hits": self.hits,
+                    "disk_hits": self.disk_hits, "misses": self.misses}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_prediction_cache():
+    """Caché compartida por todas las sesiones del proceso."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache()
+    return _cache
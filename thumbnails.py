@@ -0,0 +1,56 @@
+# thumbnails.py
+#
+# Miniaturas de las imágenes de pacientes para el historial. Se generan al
+# guardar un diagnóstico (o bajo demanda si faltan) y su ruta se guarda en
+# Imagen.ruta_thumb. Para las imágenes ya existentes:
+#   python thumbnails.py
+
+import os
+import hashlib
+from PIL import Image
+from config import THUMBNAIL_DIR, THUMBNAIL_SIZE, THUMBNAIL_FORMAT
+
+_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+def thumbnail_path(image_path):
+    """Ruta de la miniatura; el hash de la ruta completa distingue imágenes con el mismo nombre."""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    digest = hashlib.sha1(os.path.abspath(image_path).encode()).hexdigest()[:12]
+    return os.path.join(THUMBNAIL_DIR, f"{stem}-{digest}{_EXTENSIONS[THUMBNAIL_FORMAT]}")
+
+def make_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    """Crea la miniatura (lado mayor = size, sin deformar) y devuelve su ruta."""
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    thumb_path = thumbnail_path(image_path)
+    with Image.open(image_path) as img:
+        # En JPEG, draft() decodifica directamente a 1/2, 1/4 u 1/8 de la resolución
+        img.draft("RGB", (size, size))
+        img = img.convert("RGB")
+        img.thumbnail((size, size))
+        img.save(thumb_path, THUMBNAIL_FORMAT, quality=85)
+    return thumb_path
+
+def get_thumbnail(image_path, thumb_path=None):
+    """Ruta de una miniatura válida; la genera solo si falta o está desactualizada."""
+    thumb_path = thumb_path or thumbnail_path(image_path)
+    if os.path.exists(thumb_path) and os.path.getmtime(thumb_path) >= os.path.getmtime(image_path):
+        return thumb_path
+    return make_thumbnail(image_path)
+
+def backfill():
+    """Genera y registra las miniaturas de las imágenes guardadas antes de esta versión."""
+    from db_operations import DBOperations
+    from crear_bd import inicializar_base_datos
+
+    inicializar_base_datos()
+    thumbnails = []
+    for row in DBOperations.get_images_without_thumbnail():
+        if not os.path.exists(row['ruta_arch']):
+            print(f"No existe {row['ruta_arch']}")
+            continue
+        thumbnails.append((row['id_ima'], get_thumbnail(row['ruta_arch'])))
+    DBOperations.set_thumbnails(thumbnails)
+    print(f"Miniaturas registradas: {len(thumbnails)}")
+
+if __name__ == "__main__":
+    backfill()
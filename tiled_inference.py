@@ -0,0 +1,97 @@
+# tiled_inference.py
+#
+# Inferencia por ventanas deslizantes: el U-Net entrenado a 256x256 se aplica
+# sobre ventanas solapadas de la imagen a resolución completa y las
+# probabilidades se combinan con pesos que decrecen hacia los bordes de cada
+# ventana. Se procesa una fila de ventanas a la vez, así que la memoria
+# depende del tamaño de ventana y del lote, no del tamaño de la imagen.
+
+import numpy as np
+import cv2
+from PIL import Image
+from config import IMG_HEIGHT, IMG_WIDTH, NUM_CLASSES, TILE_OVERLAP, TILE_BATCH_SIZE
+
+def tile_starts(length, tile, stride):
+    """Posiciones de inicio que cubren [0, length) con la última ventana pegada al borde."""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+def blend_weights(tile_h, tile_w):
+    """Ventana 2D tipo Hann con un mínimo > 0 para que los bordes de la imagen cuenten."""
+    wy = np.sin(np.pi * (np.arange(tile_h) + 0.5) / tile_h)
+    wx = np.sin(np.pi * (np.arange(tile_w) + 0.5) / tile_w)
+    return np.maximum(np.outer(wy, wx), 1e-3).astype(np.float32)
+
+def load_full_image(image_path, scale=1.0):
+    """Imagen RGB normalizada a [0, 1] a resolución completa (o escalada por `scale`)."""
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        if scale != 1.0:
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BILINEAR)
+        return np.asarray(img, dtype=np.float32) / 255.0
+
+def predict_tiled(model, image, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE,
+                  tile=(IMG_HEIGHT, IMG_WIDTH), num_classes=NUM_CLASSES):
+    """Máscara de clases uint8 (H, W) de una imagen (H, W, 3) normalizada de cualquier tamaño."""
+    th, tw = tile
+    h, w = image.shape[:2]
+
+    # Las imágenes más pequeñas que una ventana se rellenan con ceros
+    ph, pw = max(h, th), max(w, tw)
+    if (ph, pw) != (h, w):
+        padded = np.zeros((ph, pw, 3), dtype=np.float32)
+        padded[:h, :w] = image
+        image = padded
+
+    ys = tile_starts(ph, th, th - overlap)
+    xs = tile_starts(pw, tw, tw - overlap)
+    weights = blend_weights(th, tw)
+
+    mask = np.empty((ph, pw), dtype=np.uint8)
+    # Acumuladores para las filas [base, base + th) de la imagen
+    acc = np.zeros((th, pw, num_classes), dtype=np.float32)
+    wsum = np.zeros((th, pw), dtype=np.float32)
+    base = 0
+
+    for i, y in enumerate(ys):
+        # Desplazar los acumuladores hasta la fila de inicio de esta fila de ventanas
+        shift = y - base
+        if shift:
+            acc[:th - shift] = acc[shift:]
+            acc[th - shift:] = 0
+            wsum[:th - shift] = wsum[shift:]
+            wsum[th - shift:] = 0
+            base = y
+
+        for start in range(0, len(xs), batch_size):
+            batch_xs = xs[start:start + batch_size]
+            tiles = np.stack([image[y:y + th, x:x + tw] for x in batch_xs])
+            probs = np.asarray(model.predict_on_batch(tiles), dtype=np.float32)
+            for x, p in zip(batch_xs, probs):
+                acc[:, x:x + tw] += p * weights[..., None]
+                wsum[:, x:x + tw] += weights
+
+        # Las filas anteriores a la siguiente fila de ventanas ya no cambian
+        end = ys[i + 1] if i + 1 < len(ys) else y + th
+        rows = end - base
+        mask[base:end] = np.argmax(acc[:rows] / wsum[:rows, :, None], axis=-1)
+
+    return mask[:h, :w]
+
+def predict_image_tiled(model, image_path, scale=1.0, **kwargs):
+    """Devuelve (imagen uint8, máscara uint8) a la resolución de la imagen original.
+
+    Con scale < 1 la red se aplica sobre una versión reducida y la máscara se
+    reescala (vecino más cercano) a la resolución original.
+    """
+    with Image.open(image_path) as img:
+        original = np.asarray(img.convert("RGB"))
+    image = original.astype(np.float32) / 255.0 if scale == 1.0 else load_full_image(image_path, scale)
+
+    mask = predict_tiled(model, image, **kwargs)
+    if mask.shape != original.shape[:2]:
+        mask = cv2.resize(mask, (original.shape[1], original.shape[0]), interpolation=cv2.INTER_NEAREST)
+    return original, mask
@@ -0,0 +1,122 @@
+# tracing.py
+#
+# Latencia por etapa del camino de diagnóstico. Cada etapa se mide con un
+# span (gestor de contexto) y su duración se acumula en un histograma por
+# nombre: recuento y suma totales y las últimas TRACING_WINDOW duraciones
+# para los percentiles p50/p95/p99. Los datos son por proceso y compartidos
+# por todas las sesiones de Streamlit.
+#
+#   with span("diagnostico.inferencia"):
+#       ...
+#
+#   to_prometheus()   # formato de texto de Prometheus (summary)
+#   to_json()         # el mismo contenido como JSON
+
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from config import TRACING_ENABLED, TRACING_WINDOW
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Histogram:
+    def __init__(self, window=TRACING_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds, error=False):
+        self.count += 1
+        self.total += seconds
+        self.errors += error
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = np.fromiter(self.recent, dtype=np.float64)
+        quantiles = np.quantile(recent, QUANTILES) if len(recent) else [float("nan")] * len(QUANTILES)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "sum_s": self.total,
+            "mean_ms": self.total / self.count * 1000 if self.count else float("nan"),
+            **{f"p{round(q * 100)}_ms": float(v) * 1000 for q, v in zip(QUANTILES, quantiles)},
+            "max_ms": float(recent.max()) * 1000 if len(recent) else float("nan"),
+        }
+
+class Tracer:
+    def __init__(self, enabled=TRACING_ENABLED, window=TRACING_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, error=False):
+        """Registra una duración medida fuera de un span (p. ej. espera en cola)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.window)
+            histogram.observe(seconds, error)
+
+    @contextmanager
+    def span(self, name):
+        """Mide el bloque y lo registra en el histograma de name, también si lanza una excepción."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, error)
+
+    def snapshot(self):
+        """{etapa: resumen} ordenado por nombre."""
+        with self._lock:
+            names = sorted(self._histograms)
+            return {name: self._histograms[name].summary() for name in names}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix="diagnostico_etapa"):
+        seconds, errors = f"{prefix}_segundos", f"{prefix}_errores_total"
+        lines = [f"# HELP {seconds} Duración de cada etapa del diagnóstico en segundos.",
+                 f"# TYPE {seconds} summary"]
+        error_lines = [f"# HELP {errors} Ejecuciones de la etapa que terminaron con una excepción.",
+                       f"# TYPE {errors} counter"]
+        for name, s in self.snapshot().items():
+            label = f'etapa="{name}"'
+            for q in QUANTILES:
+                lines.append(f'{seconds}{{{label},quantile="{q}"}} {s[f"p{round(q * 100)}_ms"] / 1000:.6g}')
+            lines.append(f"{seconds}_sum{{{label}}} {s['sum_s']:.6g}")
+            lines.append(f"{seconds}_count{{{label}}} {s['count']}")
+            error_lines.append(f"{errors}{{{label}}} {s['errors']}")
+        return "\n".join(lines + error_lines) + "\n"
+
+_tracer = Tracer()
+
+def get_tracer():
+    """Trazador compartido por todo el proceso."""
+    return _tracer
+
+def span(name):
+    return _tracer.span(name)
+
+def observe(name, seconds, error=False):
+    _tracer.observe(name, seconds, error)
@@ -1,27 +1,244 @@
 # train.py
+#
+#   python train.py                          # valores de config.py
+#   python train.py --epochs 50 --batch-size 16 --jit-compile
+#   python train.py --mixed-precision none   # forzar float32
+#   python train.py --fresh                  # ignorar un entrenamiento interrumpido
+#   python train.py --class-weights          # ponderar la pérdida por frecuencia de clase
+#   python train.py --no-sparse              # etiquetas one-hot
+#
+# Si el entrenamiento se corta, al volver a lanzarlo continúa desde la última
+# época completada (CHECKPOINT_DIR/backup). El mejor modelo según val_loss se
+# guarda en CHECKPOINT_DIR/best.weights.h5 (y su val_loss en best.json, para
+# que al reanudar solo lo sustituya una época mejor). --fresh borra ambos.
+#
+# Entrenamiento distribuido en varios procesos o nodos: ver distributed.py.
 
-from data_loader import load_dataset
+import os
+import sys
+import json
+import shutil
+import argparse
+import numpy as np
+import tensorflow as tf
+from data_loader import load_dataset, load_dataset_streaming, label_counts, class_weights_from_counts
 from unet_model import unet_model
 from utils import visualize_prediction
+from model_registry import save_model
+from distributed import (configure_threads, worker_info, get_strategy, launch_local_workers,
+                         ThroughputCallback)
+from config import (TRAIN_IMG_DIR, TRAIN_MASK_DIR, STREAMING_LOADER, MODEL_PATH,
+                    TRAIN_EPOCHS, TRAIN_BATCH_SIZE, MIXED_PRECISION, JIT_COMPILE,
+                    CHECKPOINT_DIR, EARLY_STOPPING_PATIENCE, SPARSE_LABELS, CLASS_WEIGHTS,
+                    NUM_CLASSES, LOCAL_WORKERS, INTRA_OP_THREADS, INTER_OP_THREADS, AUGMENT)
+
+def cpu_supports_bf16():
+    """True si la CPU tiene instrucciones bfloat16 nativas (AVX512-BF16 o AMX)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def resolve_precision(policy):
+    """Traduce "auto" a la política adecuada para el hardware disponible."""
+    if policy in (None, "none", "float32"):
+        return None
+    if policy != "auto":
+        return policy
+    if tf.config.list_physical_devices("GPU"):
+        return "mixed_float16"
+    # En CPU sin bf16 nativo la precisión mixta es más lenta que float32
+    return "mixed_bfloat16" if cpu_supports_bf16() else None
+
+class BestCheckpoint(tf.keras.callbacks.ModelCheckpoint):
+    """ModelCheckpoint que guarda también su mejor valor (best.json) para poder reanudar."""
+
+    def on_epoch_end(self, epoch, logs=None):
+        best = self.best
+        super().on_epoch_end(epoch, logs)
+        if self.best != best:
+            with open(best_value_path(os.path.dirname(self.filepath)), "w") as f:
+                json.dump({"monitor": self.monitor, "best": float(self.best)}, f)
+
+def best_value_path(checkpoint_dir):
+    return os.path.join(checkpoint_dir, "best.json")
+
+def load_best_value(checkpoint_dir):
+    try:
+        with open(best_value_path(checkpoint_dir)) as f:
+            return json.load(f)["best"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def clear_checkpoints(checkpoint_dir):
+    """Descarta el estado interrumpido y el mejor checkpoint de entrenamientos anteriores."""
+    shutil.rmtree(os.path.join(checkpoint_dir, "backup"), ignore_errors=True)
+    for name in ("best.weights.h5", "best.json"):
+        path = os.path.join(checkpoint_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def build_callbacks(checkpoint_dir, patience):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    backup_dir = os.path.join(checkpoint_dir, "backup")
+    # Al reanudar, una época peor que las de antes del corte no debe pisar el mejor checkpoint
+    best = load_best_value(checkpoint_dir) if os.path.isdir(backup_dir) else None
+    if best is not None:
+        print(f"Reanudando con el mejor val_loss anterior: {best:.5f}")
+    return [
+        tf.keras.callbacks.BackupAndRestore(backup_dir),
+        BestCheckpoint(os.path.join(checkpoint_dir, "best.weights.h5"),
+                       monitor="val_loss", save_best_only=True,
+                       save_weights_only=True, initial_value_threshold=best),
+        tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=patience,
+                                         restore_best_weights=True),
+    ]
+
+def export_float32(model):
+    """Copia de los pesos en un modelo float32 (y sin estrategia) para servir con model_registry."""
+    tf.keras.mixed_precision.set_global_policy("float32")
+    exported = unet_model()
+    exported.set_weights(model.get_weights())
+    return exported
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Entrena la U-Net periodontal")
+    parser.add_argument("--epochs", type=int, default=TRAIN_EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=TRAIN_BATCH_SIZE)
+    parser.add_argument("--mixed-precision", default=MIXED_PRECISION,
+                        help="auto, mixed_bfloat16, mixed_float16 o none")
+    parser.add_argument("--jit-compile", action=argparse.BooleanOptionalAction, default=JIT_COMPILE,
+                        help="Compilar el paso de entrenamiento con XLA")
+    parser.add_argument("--sparse", action=argparse.BooleanOptionalAction, default=SPARSE_LABELS,
+                        help="Máscaras como índices uint8 en lugar de one-hot")
+    parser.add_argument("--class-weights", action=argparse.BooleanOptionalAction,
+                        default=CLASS_WEIGHTS is not None,
+                        help="Ponderar cada píxel según la frecuencia de su clase")
+    parser.add_argument("--augment", action=argparse.BooleanOptionalAction, default=AUGMENT,
+                        help="Aumento de datos en el split de entrenamiento (augmentation.py)")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--patience", type=int, default=EARLY_STOPPING_PATIENCE)
+    parser.add_argument("--output", default=MODEL_PATH)
+    parser.add_argument("--fresh", action="store_true",
+                        help="Descartar el estado de un entrenamiento interrumpido")
+    parser.add_argument("--local-workers", type=int, default=LOCAL_WORKERS,
+                        help="Procesos de entrenamiento data-parallel en esta máquina")
+    parser.add_argument("--intra-op-threads", type=int, default=INTRA_OP_THREADS)
+    parser.add_argument("--inter-op-threads", type=int, default=INTER_OP_THREADS)
+    return parser.parse_args()
+
+def _argv_without_local_workers():
+    argv, skip = [], False
+    for arg in sys.argv:
+        if skip:
+            skip = False
+        elif arg == "--local-workers":
+            skip = True
+        elif not arg.startswith("--local-workers="):
+            argv.append(arg)
+    return argv
 
 def main():
+    args = parse_args()
+    if args.local_workers > 1 and "TF_CONFIG" not in os.environ:
+        sys.exit(launch_local_workers(args.local_workers, _argv_without_local_workers(),
+                                      args.intra_op_threads))
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+
+    policy = resolve_precision(args.mixed_precision)
+    if policy:
+        tf.keras.mixed_precision.set_global_policy(policy)
+    print(f"Precisión: {policy or 'float32'} | XLA: {'sí' if args.jit_compile else 'no'}")
+
+    strategy = get_strategy()
+    num_workers, worker_index = worker_info()
+    is_chief = worker_index == 0
+    if not is_chief:
+        # Los demás trabajadores guardan su estado aparte para no pisar al principal
+        args.checkpoint_dir = os.path.join(args.checkpoint_dir, f"worker{worker_index}")
+    # --batch-size es por réplica; el lote global suma el de todas las réplicas
+    global_batch = args.batch_size * strategy.num_replicas_in_sync
+    if num_workers > 1:
+        print(f"Trabajador {worker_index + 1}/{num_workers} | lote global: {global_batch}")
+        if not STREAMING_LOADER:
+            sys.exit("El entrenamiento distribuido requiere STREAMING_LOADER = True")
+
+    if args.fresh:
+        clear_checkpoints(args.checkpoint_dir)
+
+    class_weights = (CLASS_WEIGHTS or "auto") if args.class_weights else None
+
     print("Cargando datos...")
-    X_train, X_val, y_train, y_val = load_dataset("Dataset/Training/Images", "Dataset/Training/Masks")
+    if STREAMING_LOADER:
+        shard = (num_workers, worker_index) if num_workers > 1 else None
+        train_ds, val_ds = load_dataset_streaming(TRAIN_IMG_DIR, TRAIN_MASK_DIR, batch_size=args.batch_size,
+                                                  one_hot=not args.sparse, class_weights=class_weights,
+                                                  shard=shard, augment=args.augment)
+    else:
+        if args.augment:
+            print("Aviso: el aumento de datos solo está disponible con STREAMING_LOADER = True")
+        X_train, X_val, y_train, y_val = load_dataset(TRAIN_IMG_DIR, TRAIN_MASK_DIR, one_hot=not args.sparse)
+        sample_weight = None
+        if class_weights:
+            labels = y_train if args.sparse else y_train.argmax(axis=-1)
+            if isinstance(class_weights, str):
+                class_weights = class_weights_from_counts(label_counts(labels))
+            class_weights = np.asarray(class_weights, dtype=np.float32)
+            print("Pesos por clase:", class_weights.astype(np.float64).round(3).tolist())
+            sample_weight = class_weights[labels]
 
     print("Construyendo modelo...")
-    model = unet_model()
-    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    with strategy.scope():
+        model = unet_model()
+        loss = 'sparse_categorical_crossentropy' if args.sparse else 'categorical_crossentropy'
+        mean_iou = tf.keras.metrics.MeanIoU(num_classes=NUM_CLASSES, sparse_y_true=args.sparse,
+                                            sparse_y_pred=False, name="mean_iou")
+        # Los pesos por píxel solo afectan a la pérdida: accuracy y mIoU van en
+        # metrics (sin ponderar) y no hay weighted_metrics
+        model.compile(optimizer='adam', loss=loss, metrics=['accuracy', mean_iou], weighted_metrics=[],
+                      jit_compile=args.jit_compile)
+    callbacks = build_callbacks(args.checkpoint_dir, args.patience) + [ThroughputCallback(global_batch)]
 
     print("Entrenando...")
-    model.fit(X_train, y_train,
-              validation_data=(X_val, y_val),
-              epochs=20,
-              batch_size=8)
+    if num_workers > 1:
+        # Cada trabajador ya tiene su parte: que la estrategia no vuelva a repartir los lotes
+        fit_train = strategy.distribute_datasets_from_function(lambda _: train_ds)
+        fit_val = strategy.distribute_datasets_from_function(lambda _: val_ds)
+    elif STREAMING_LOADER:
+        fit_train, fit_val = train_ds, val_ds
+    if STREAMING_LOADER:
+        model.fit(fit_train,
+                  validation_data=fit_val,
+                  epochs=args.epochs,
+                  callbacks=callbacks)
+    else:
+        model.fit(X_train, y_train,
+                  validation_data=(X_val, y_val),
+                  epochs=args.epochs,
+                  batch_size=args.batch_size,
+                  sample_weight=sample_weight,
+                  callbacks=callbacks)
+
+    # EarlyStopping solo restaura si se detuvo antes; el mejor checkpoint vale siempre
+    best_path = os.path.join(args.checkpoint_dir, "best.weights.h5")
+    if os.path.exists(best_path):
+        model.load_weights(best_path)
+    if policy or num_workers > 1:
+        # Copia fuera de la estrategia: predecir con el modelo distribuido
+        # necesitaría a todos los trabajadores
+        model = export_float32(model)
+    if not is_chief:
+        return
 
-    model.save("unet_periodontal.h5")
-    print("Modelo guardado como unet_periodontal.h5")
+    save_model(model, args.output)
+    print(f"Modelo guardado como {args.output}")
 
     print("Visualizando predicción...")
+    if STREAMING_LOADER:
+        X_val, y_val = next(iter(val_ds))
+        X_val, y_val = X_val.numpy(), y_val.numpy()
     visualize_prediction(model, X_val, y_val, index=0)
 
 if __name__ == "__main__":
@@ -31,7 +31,9 @@ def unet_model(input_size=(IMG_HEIGHT, IMG_WIDTH, 3), num_classes=NUM_CLASSES):
     c5 = Conv2D(32, 3, activation='relu', padding='same')(m5)
     c5 = Conv2D(32, 3, activation='relu', padding='same')(c5)
 
-    outputs = Conv2D(num_classes, 1, activation='softmax')(c5)
+    # La salida siempre en float32: con precisión mixta el softmax y la pérdida
+    # en (b)float16 pierden precisión
+    outputs = Conv2D(num_classes, 1, activation='softmax', dtype='float32')(c5)
 
     return Model(inputs=[inputs], outputs=[outputs])
 
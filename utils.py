@@ -4,7 +4,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 def visualize_prediction(model, X_val, y_val, index=0):
-    pred = model.predict(np.expand_dims(X_val[index], axis=0))[0]
+    # predict_on_batch evita el bucle de predicción de model.predict para una sola imagen
+    pred = np.asarray(model.predict_on_batch(np.expand_dims(X_val[index], axis=0)))[0]
     pred_mask = np.argmax(pred, axis=-1)
 
     plt.figure(figsize=(10, 4))
@@ -13,7 +14,10 @@ def visualize_prediction(model, X_val, y_val, index=0):
     plt.title("Imagen")
     
     plt.subplot(1, 3, 2)
-    plt.imshow(np.argmax(y_val[index], axis=-1))
+    true_mask = y_val[index]
+    if true_mask.ndim == 3:  # one-hot
+        true_mask = np.argmax(true_mask, axis=-1)
+    plt.imshow(true_mask)
     plt.title("Máscara Real")
     
     plt.subplot(1, 3, 3)